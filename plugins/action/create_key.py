@@ -0,0 +1,140 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible.plugins.action import ActionBase
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import search_accounts, create_account
+
+try:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519, rsa
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    argument_spec = {
+        "validate_certs": {"type": "bool", "default": True},
+        "cyberark_session": {"required": True, "type": "dict", "no_log": True},
+        "username": {"required": True, "type": "str"},
+        "address": {"type": "str"},
+        "safe": {"required": True, "type": "str"},
+        "platform_id": {"required": True, "type": "str"},
+        "key_type": {"type": "str", "choices": ["rsa", "ed25519"], "default": "rsa"},
+        "key_bits": {"type": "int", "default": 4096},
+        "comment": {"type": "str", "default": "cyberark"},
+    }
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        validation, params = self.validate_argument_spec(argument_spec=self.argument_spec)
+
+        if not HAS_CRYPTOGRAPHY:
+            result.update(failed=True, success=False,
+                          msg="The cryptography python library is required on the controller")
+            return result
+
+        # Guess account's address (if not defined)
+        if params['address'] is None:
+            params['address'] = self._guess_address(task_vars)
+
+        cyberark_session = params['cyberark_session']
+        account = dict(
+            safe=params['safe'],
+            username=params['username'],
+            address=params['address'],
+            platform_id=params['platform_id'],
+            secret_type='key',
+        )
+
+        # Check if private key is already in PAM
+        lookup = dict(account, cyberark_session=cyberark_session, identified_by='address,username,platform_id')
+        search = search_accounts(lookup)
+        if not search['success']:
+            result.update(failed=True, success=False, msg="Search failed", response=search['content'])
+            return result
+        if len(search['content']) > 0:
+            result.update(changed=False, success=True, account=search['content'][0])
+            return result
+        if self._task.check_mode:
+            # No key is generated nor uploaded: PAM would hold a key not authorized on the host
+            result.update(changed=True, success=True)
+            return result
+
+        private_key, public_key = generate_ssh_key(params['key_type'], params['key_bits'], params['comment'])
+
+        # Upload private key to PAM, it is never written to disk
+        account['secret'] = private_key
+        account['secret_management'] = dict(automatic_management_enabled=True)
+        created = create_account(cyberark_session, account)
+        del account['secret'], private_key
+        if not created['success']:
+            result.update(failed=True, success=False, msg="Key upload failed", response=created['content'])
+            return result
+        if not created['changed']:
+            # 409 Conflict: another run uploaded a key meanwhile, the generated one is dropped
+            search = search_accounts(lookup)
+            if not search['success'] or len(search['content']) == 0:
+                result.update(failed=True, success=False, msg="Key already exists but cannot be found",
+                              response=search['content'])
+                return result
+            result.update(changed=False, success=True, account=search['content'][0])
+            return result
+
+        # Store public key to authorized_keys file on the host, create the user if needed
+        authorized = self._authorize_key(params['username'], public_key, task_vars)
+        if authorized.get('failed'):
+            result.update(failed=True, changed=created['changed'], success=False, msg="Failed to authorize key",
+                          account=created['content'], response=authorized.get('msg'))
+            return result
+
+        result.update(changed=created['changed'], success=True, account=created['content'], public_key=public_key)
+        return result
+
+    def _guess_address(self, task_vars):
+        facts = task_vars.get('ansible_facts', {})
+        if 'default_ipv4' in facts and 'address' in facts['default_ipv4']:
+            return facts['default_ipv4']['address']
+
+        return task_vars['hostvars'][task_vars['inventory_hostname']]['ansible_env']['SSH_CONNECTION'].split(' ')[2]
+
+    def _authorize_key(self, username, public_key, task_vars):
+        key_args = dict(user=username, key=public_key, state='present')
+        authorized = self._execute_module(module_name='ansible.posix.authorized_key', module_args=key_args,
+                                          task_vars=task_vars)
+        if not authorized.get('failed'):
+            return authorized
+
+        # Fails if the user doesn't exist, create it and retry
+        user = self._execute_module(module_name='ansible.builtin.user', module_args=dict(name=username),
+                                    task_vars=task_vars)
+        if user.get('failed'):
+            return user
+
+        return self._execute_module(module_name='ansible.posix.authorized_key', module_args=key_args,
+                                    task_vars=task_vars)
+
+
+# Generate an ssh key in memory
+# Return (private key, public key) in OpenSSH formats. RSA private keys are PEM encoded.
+def generate_ssh_key(key_type, key_bits, comment):
+    if key_type == 'ed25519':
+        key = ed25519.Ed25519PrivateKey.generate()
+        private_format = serialization.PrivateFormat.OpenSSH
+    else:
+        key = rsa.generate_private_key(public_exponent=65537, key_size=key_bits)
+        private_format = serialization.PrivateFormat.TraditionalOpenSSL
+
+    private_key = key.private_bytes(serialization.Encoding.PEM, private_format, serialization.NoEncryption())
+    public_key = key.public_key().public_bytes(serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH)
+
+    return private_key.decode('ascii'), public_key.decode('ascii') + ' ' + comment
@@ -0,0 +1,182 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible.errors import AnsibleError
+from ansible.plugins.action import ActionBase
+from ansible.utils.encrypt import do_encrypt, random_password
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts, create_account,
+                                                                                delete_account)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import bulk_run
+
+# Create missing users then set their password hashes, read from stdin as "user:hash" lines.
+# Requires useradd and chpasswd (Linux shadow-utils), exits with SET_PASSWORDS_UNSUPPORTED otherwise.
+SET_PASSWORDS_UNSUPPORTED = 127
+SET_PASSWORDS_SCRIPT = '''command -v useradd >/dev/null 2>&1 && command -v chpasswd >/dev/null 2>&1 || exit 127
+set -e
+while IFS=: read -r user hash; do
+  id -u "$user" >/dev/null 2>&1 || useradd -m "$user"
+  printf '%s:%s\\n' "$user" "$hash" | chpasswd -e
+done'''
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    argument_spec = {
+        "validate_certs": {"type": "bool", "default": True},
+        "cyberark_session": {"required": True, "type": "dict", "no_log": True},
+        "users": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "username": {"required": True, "type": "str"},
+                "password": {"type": "str", "no_log": True},
+                "address": {"type": "str"},
+            },
+        },
+        "address": {"type": "str"},
+        "safe": {"required": True, "type": "str"},
+        "platform_id": {"required": True, "type": "str"},
+        "password_length": {"type": "int", "default": 24},
+        "parallelism": {"type": "int", "default": 10},
+    }
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        validation, params = self.validate_argument_spec(argument_spec=self.argument_spec)
+
+        # Guess accounts' address (if not defined)
+        if params['address'] is None and not all(user['address'] for user in params['users']):
+            params['address'] = self._guess_address(task_vars)
+
+        # Generate random passwords (if not defined), not in check mode: nothing is uploaded
+        check_mode = self._task.check_mode
+        users = [dict(username=user['username'], address=user['address'] or params['address'],
+                      password=None if check_mode else (user['password']
+                                                        or random_password(length=params['password_length'])))
+                 for user in params['users']]
+
+        # Upload passwords to PAM concurrently
+        cyberark_session = params['cyberark_session']
+        uploads = bulk_run(lambda user: upload_password(cyberark_session, params, user, check_mode), users,
+                           params['parallelism'])
+
+        out_users = []
+        for user, uploaded in zip(users, uploads):
+            out_user = dict(username=user['username'], success=uploaded['success'], changed=uploaded['changed'])
+            if uploaded['success'] and uploaded['content'] is not None:
+                out_user['id'] = uploaded['content']['id']
+            elif not uploaded['success']:
+                out_user['response'] = uploaded['content']
+            out_users.append(out_user)
+
+        changed = any(user['changed'] for user in out_users)
+        result.update(changed=changed, success=True, users=out_users)
+        if not all(user['success'] for user in out_users):
+            # The passwords uploaded are set on the host below: the next attempt only uploads the others
+            result.update(failed=True, success=False, retryable=True, msg="Failed to upload passwords")
+        if check_mode:
+            return result
+
+        # Set the uploaded passwords on the host in one remote step
+        uploaded_users = [(user, uploaded) for user, uploaded in zip(users, uploads) if uploaded['changed']]
+        if len(uploaded_users) > 0:
+            try:
+                hashes = ''.join("%s:%s\n" % (user['username'], do_encrypt(user['password'], 'sha512_crypt'))
+                                 for user, uploaded in uploaded_users)
+            except AnsibleError as encrypt_error:
+                set_passwords = dict(failed=True, msg="Failed to hash passwords: %s" % encrypt_error)
+            else:
+                set_passwords = self._set_passwords(hashes, task_vars)
+                del hashes
+
+            if set_passwords.get('failed') or set_passwords.get('rc', 0) != 0:
+                # The passwords are lost: remove their accounts from PAM so that the next attempt creates them again
+                removed = bulk_run(lambda item: delete_account(cyberark_session, item[1]['content']['id']),
+                                   uploaded_users, params['parallelism'])
+                result.update(failed=True, success=False, msg="Failed to set passwords on host",
+                              retryable=all(deleted['success'] for deleted in removed),
+                              response=set_passwords.get('stderr') or set_passwords.get('msg'))
+
+        # Remove passwords from memory
+        del users, uploaded_users
+        return result
+
+    # Set the password hashes ("user:hash" lines) on the host, creating missing users
+    def _set_passwords(self, hashes, task_vars):
+        # The hashes are module arguments: hide them from logs whatever the task's no_log
+        task_no_log = self._task.no_log
+        self._task.no_log = True
+        try:
+            set_passwords = self._execute_module(module_name='ansible.legacy.command',
+                                                 module_args=dict(_raw_params=SET_PASSWORDS_SCRIPT, _uses_shell=True,
+                                                                  stdin=hashes, stdin_add_newline=False),
+                                                 task_vars=task_vars)
+            if set_passwords.get('rc') == SET_PASSWORDS_UNSUPPORTED:
+                # No shadow-utils on the host (eg. BSD, macOS): one user module call per user
+                set_passwords = self._set_passwords_with_user_module(hashes, task_vars)
+        finally:
+            self._task.no_log = task_no_log
+
+        return set_passwords
+
+    # Set the password hashes ("user:hash" lines) with the portable user module, creating missing users
+    def _set_passwords_with_user_module(self, hashes, task_vars):
+        for line in hashes.splitlines():
+            username, password_hash = line.split(':', 1)
+            set_password = self._execute_module(module_name='ansible.legacy.user',
+                                                module_args=dict(name=username, password=password_hash,
+                                                                 update_password='always', create_home=True),
+                                                task_vars=task_vars)
+            if set_password.get('failed'):
+                return set_password
+
+        return dict(failed=False)
+
+    def _guess_address(self, task_vars):
+        facts = task_vars.get('ansible_facts', {})
+        if 'default_ipv4' in facts and 'address' in facts['default_ipv4']:
+            return facts['default_ipv4']['address']
+
+        return task_vars['hostvars'][task_vars['inventory_hostname']]['ansible_env']['SSH_CONNECTION'].split(' ')[2]
+
+
+# Upload the password of a user, unless its account already exists in PAM. With dry_run, nothing is uploaded.
+# Return dict(success, changed, content=account, None with dry_run, or error)
+def upload_password(cyberark_session, params, user, dry_run=False):
+    account = dict(
+        safe=params['safe'],
+        username=user['username'],
+        address=user['address'],
+        platform_id=params['platform_id'],
+        secret_type='password',
+    )
+
+    lookup = dict(account, cyberark_session=cyberark_session, identified_by='address,username,platform_id')
+    search = search_accounts(lookup)
+    if not search['success']:
+        return dict(success=False, changed=False, content=search['content'])
+    if len(search['content']) > 0:
+        return dict(success=True, changed=False, content=search['content'][0])
+    if dry_run:
+        return dict(success=True, changed=True, content=None)
+
+    created = create_account(cyberark_session, dict(account, secret=user['password']))
+    if created['changed'] or not created['success']:
+        return created
+
+    # 409 Conflict: the account was created meanwhile, look it up
+    search = search_accounts(lookup)
+    if not search['success']:
+        return dict(success=False, changed=False, content=search['content'])
+    if len(search['content']) == 0:
+        return dict(success=False, changed=False, content="Account already exists but cannot be found")
+    return dict(success=True, changed=False, content=search['content'][0])
@@ -0,0 +1,14 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible_collections.cyberarkfrlab.pam.plugins.modules import delete_safe
+from ansible_collections.cyberarkfrlab.pam.plugins.plugin_utils.module_action import ModuleActionBase
+
+
+# Run cyberarkfrlab.pam.delete_safe in the controller's process
+class ActionModule(ModuleActionBase):
+
+    module = delete_safe
@@ -0,0 +1,107 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+import json
+
+from ansible.plugins.action import ActionBase
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts,
+                                                                                retrieve_account_secret_request)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.async_request import async_send_all
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import AdaptiveConcurrency, bulk_run
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    argument_spec = {
+        "validate_certs": {"type": "bool", "default": True},
+        "cyberark_session": {"type": "dict", "no_log": True},
+        "accounts": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "id": {"type": "str"},
+                "safe": {"type": "str"},
+                "identified_by": {"type": "str", "default": "username,address,platform_id"},
+                "username": {"type": "str"},
+                "address": {"type": "str"},
+                "platform_id": {"type": "str"},
+                "name": {"type": "str"},
+                "secret_type": {"type": "str", "choices": ["password", "key"]},
+            },
+            "required_one_of": [["id", "safe"]],
+        },
+        "reason": {"required": True, "type": "str"},
+        "parallelism": {"type": "int", "default": 10},
+        "min_parallelism": {"type": "int"},
+    }
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        del tmp
+
+        # Secrets are returned: never display the result, whatever the task's no_log
+        result['_ansible_no_log'] = True
+
+        validation, params = self.validate_argument_spec(argument_spec=self.argument_spec)
+        cyberark_session = params['cyberark_session']
+
+        # Use the task's httpapi connection (cyberarkfrlab.pam.pvwa) when there is no cyberark_session
+        if cyberark_session is None:
+            socket_path = getattr(self._connection, 'socket_path', None)
+            if socket_path is None:
+                result.update(failed=True, success=False, msg="cyberark_session is required without the "
+                                                              "cyberarkfrlab.pam.pvwa httpapi connection")
+                return result
+            cyberark_session = dict(api_base_url='', socket_path=socket_path, validate_certs=True)
+
+        # Resolve accounts without id concurrently
+        resolved = bulk_run(lambda account: resolve_account(cyberark_session, account), params['accounts'],
+                            params['parallelism'])
+        errors = [dict(index=index, msg=account['content']) for index, account in enumerate(resolved)
+                  if not account['success']]
+        if len(errors) > 0:
+            result.update(failed=True, success=False, msg="Failed to find %d accounts" % len(errors), errors=errors)
+            return result
+
+        # Retrieve secrets concurrently, reusing connections to PAM
+        concurrency = AdaptiveConcurrency(params['min_parallelism'] or params['parallelism'], params['parallelism'])
+        retrieved = async_send_all(cyberark_session,
+                                   [retrieve_account_secret_request(cyberark_session, account['content']['id'],
+                                                                    params['reason']) for account in resolved],
+                                   concurrency)
+        result['concurrency'] = concurrency.stats()
+
+        errors = [dict(index=index, id=account['content']['id'], code=secret['code'], msg=secret['content'])
+                  for index, (account, secret) in enumerate(zip(resolved, retrieved)) if not secret['success']]
+        if len(errors) > 0:
+            result.update(failed=True, success=False, msg="Failed to retrieve %d secrets" % len(errors),
+                          errors=errors)
+            return result
+
+        secrets = [dict(account['content'], secret=json.loads(secret['content']))
+                   for account, secret in zip(resolved, retrieved)]
+        result.update(changed=False, success=True, secrets=secrets)
+        return result
+
+
+# Find the account to retrieve, unless its id is given
+# Return dict(success, content=account) or the error
+def resolve_account(cyberark_session, account):
+    if account['id'] is not None:
+        return dict(success=True, content=dict(id=account['id']))
+
+    search = search_accounts(dict(account, cyberark_session=cyberark_session,
+                                  fields=['safe', 'username', 'address', 'platform_id', 'secret_type']))
+    if not search['success']:
+        return dict(success=False, content=search['content'])
+    if len(search['content']) != 1:
+        return dict(success=False, content='Found %d accounts' % len(search['content']))
+
+    return dict(success=True, content=search['content'][0])
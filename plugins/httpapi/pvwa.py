@@ -0,0 +1,113 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: pvwa
+author:
+    - Jérôme Coste (@Kanabos)
+short_description: HttpApi plugin for CyberArk PAM (Self Hosted or Privilege Cloud)
+description:
+    - Keep a logged-on PAM session in Ansible's persistent connection daemon, shared by all the tasks of a play.
+      The collection's modules use it instead of I(cyberark_session) when it is the task's connection.
+    - Connections to PAM are kept alive between requests. The session token is renewed when PAM rejects it.
+    - Set C(ansible_connection=ansible.netcommon.httpapi) and C(ansible_network_os=cyberarkfrlab.pam.pvwa). The PAM
+      host is C(ansible_host), the service account C(ansible_user) and C(ansible_httpapi_password).
+version_added: "1.2.0"
+options:
+    identity_url:
+        description:
+            - Identity tenant URL (eg. C(https://abc1234.id.cyberark.cloud)). When set, the service account
+              authenticates to Identity (Privilege Cloud). Otherwise, it authenticates to PAM Self Hosted.
+        type: str
+        env:
+            - name: CYBERARK_IDENTITY_URL
+        vars:
+            - name: cyberark_identity_url
+    auth_method:
+        description: PAM Self Hosted authentication method.
+        type: str
+        default: CyberArk
+        choices: [CyberArk, LDAP, RADIUS, Windows]
+        vars:
+            - name: cyberark_auth_method
+'''
+
+import json
+
+from ansible.errors import AnsibleConnectionFailure
+from ansible.module_utils.common.text.converters import to_text
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+from ansible.module_utils.urls import open_url
+from ansible.plugins.httpapi import HttpApiBase
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import ConnectionPool
+
+
+class HttpApi(HttpApiBase):
+
+    def __init__(self, connection):
+        super(HttpApi, self).__init__(connection)
+        self.credentials = None
+        self.pool = None
+
+    def login(self, username, password):
+        self.credentials = (username, password)
+        token = self._logon(username, password)
+
+        self.connection._auth = {"Authorization": token}
+        if self.pool is not None:
+            self.pool.close()
+        self.pool = ConnectionPool(dict(api_base_url=self.connection._url, token=token,
+                                        validate_certs=self.connection.get_option('validate_certs')))
+
+    def logout(self):
+        if self.pool is None:
+            return
+
+        # Identity tokens expire by themselves
+        if not self.get_option('identity_url'):
+            self.pool.send("POST", self.connection._url + "/PasswordVault/API/Auth/Logoff", success_codes=(200,))
+        self.pool.close()
+        self.pool = None
+        self.connection._auth = None
+
+    # Called by modules through the persistent connection (see module_utils/request.py)
+    # Return dict(code, content) as req_send does, code is None on network errors
+    def send_request(self, method, path, data=None):
+        # The connection logs on when first used
+        if not self.connection.connected:
+            self.connection._connect()
+        if self.pool is None:
+            raise AnsibleConnectionFailure("No PAM session, check ansible_user and ansible_httpapi_password")
+
+        response = self.pool.send(method, self.connection._url + path, data)
+
+        # Session expired: log on again and retry once
+        if response['code'] == 401 and self.credentials is not None:
+            self.login(*self.credentials)
+            response = self.pool.send(method, self.connection._url + path, data)
+
+        return dict(code=response['code'], content=to_text(response['content'], errors='surrogate_or_strict'))
+
+    def _logon(self, username, password):
+        validate_certs = self.connection.get_option('validate_certs')
+        try:
+            if self.get_option('identity_url'):
+                response = open_url(self.get_option('identity_url') + "/oauth2/platformtoken", method="POST",
+                                    data=urlencode(dict(grant_type='client_credentials', client_id=username,
+                                                        client_secret=password)),
+                                    headers={"Content-Type": "application/x-www-form-urlencoded"},
+                                    validate_certs=validate_certs)
+                return "Bearer " + json.loads(response.read())['access_token']
+
+            response = open_url(self.connection._url + "/PasswordVault/API/auth/" + self.get_option('auth_method')
+                                + "/Logon", method="POST",
+                                data=json.dumps(dict(username=username, password=password, concurrentSession=True)),
+                                headers={"Content-Type": "application/json"}, validate_certs=validate_certs)
+            return json.loads(response.read())
+        except Exception as logon_exception:
+            raise AnsibleConnectionFailure("Failed to log on to PAM: %s" % to_text(logon_exception))
@@ -0,0 +1,123 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: account_index
+
+short_description: Query the local SQLite index of accounts and safes.
+
+version_added: "1.2.0"
+
+description:
+ - Return the accounts (or safes) of a local index built by M(cyberarkfrlab.pam.index_accounts) matching all
+   the given criteria. Nothing is requested to PAM.
+   Accounts are returned as by M(cyberarkfrlab.pam.get_account), safes as by M(cyberarkfrlab.pam.get_safe).
+
+options:
+    database:
+        description: Path of the SQLite database built by M(cyberarkfrlab.pam.index_accounts).
+        required: true
+        type: path
+    table:
+        description: Objects to query.
+        required: false
+        default: accounts
+        choices: [accounts, safes]
+        type: str
+    id:
+        description: Id of the account or safe.
+        required: false
+        type: str
+    safe:
+        description: Account's safe.
+        required: false
+        type: str
+    username:
+        description: Account's username.
+        required: false
+        type: str
+    address:
+        description: Account's address.
+        required: false
+        type: str
+    platform_id:
+        description: Id of the platform associated with the account.
+        required: false
+        type: str
+    secret_type:
+        description: Account's secret type.
+        required: false
+        choices: [password, key]
+        type: str
+    name:
+        description: Account's or safe's name.
+        required: false
+        type: str
+    cpm:
+        description: Safe's managing cpm.
+        required: false
+        type: str
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Check operator account is onboarded"
+  ansible.builtin.assert:
+    that: query('cyberarkfrlab.pam.account_index', database='/var/lib/pam/accounts.db',
+                username='operator', address=ansible_default_ipv4.address) | length == 1
+
+- name: "List safes managed by a CPM"
+  ansible.builtin.debug:
+    msg: "{{ query('cyberarkfrlab.pam.account_index', database='/var/lib/pam/accounts.db', table='safes',
+                   cpm='PasswordManager') | map(attribute='name') }}"
+'''
+
+RETURN = r'''
+_raw:
+    description: Accounts or safes matching all the criteria.
+    type: list
+    elements: dict
+'''
+
+import os
+import sqlite3
+
+from ansible.errors import AnsibleLookupError
+from ansible.plugins.lookup import LookupBase
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.index import index_connect, index_query
+
+CRITERIA = ['id', 'safe', 'username', 'address', 'platform_id', 'secret_type', 'name', 'cpm']
+
+
+class LookupModule(LookupBase):
+
+    def run(self, terms, variables=None, **kwargs):
+        self.set_options(var_options=variables, direct=kwargs)
+
+        database = self.get_option('database')
+        if not os.path.exists(database):
+            raise AnsibleLookupError("Account index %s doesn't exist" % database)
+
+        criteria = dict((criterion, self.get_option(criterion)) for criterion in CRITERIA
+                        if self.get_option(criterion) is not None)
+
+        # The lookup never creates nor modifies the index
+        try:
+            connection = index_connect(database, read_only=True)
+        except sqlite3.Error as connect_exception:
+            raise AnsibleLookupError("Failed to open account index %s: %s" % (database, connect_exception))
+        try:
+            return index_query(connection, self.get_option('table'), criteria)
+        except ValueError as query_exception:
+            raise AnsibleLookupError(str(query_exception))
+        except sqlite3.Error as query_exception:
+            raise AnsibleLookupError("Failed to query account index %s: %s" % (database, query_exception))
+        finally:
+            connection.close()
@@ -2,15 +2,56 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
 import json
+import re
+import sys
+import time
 
-from ansible.module_utils.urls import open_url
 from ansible.module_utils.six.moves.urllib.parse import quote
 
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.generic import rename_keys, filter_objects_by
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_get_build_url
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import AdaptiveConcurrency, bulk_run, interleave
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.generic import (compile_key_mapper,
+                                                                                get_projection_fields, get_key_ci)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import (req_add_transfer, req_get_build_url,
+                                                                                req_get_pages, req_get_json, req_send,
+                                                                                req_send_all, PAGE_SIZE)
 
-from ansible.module_utils.six.moves.urllib.error import HTTPError
-from ansible.module_utils.six.moves.http_client import HTTPException
+
+# Account keys returned by PAM API renamed to the collection's keys
+ACCOUNT_KEY_MAP = {
+    'categoryModificationTime': 'modified_time',
+    'createdTime': 'created_time',
+    'secretType': 'secret_type',
+    'platformAccountProperties': 'platform_account_properties',
+    'platformId': 'platform_id',
+    'safeName': 'safe',
+    'secretManagement': 'secret_management',
+    'userName': 'username'
+}
+
+# Collection's account keys renamed to PAM API keys
+API_ACCOUNT_KEY_MAP = dict((out_key, key) for key, out_key in ACCOUNT_KEY_MAP.items())
+
+# Collection's secret management keys renamed to PAM API keys
+API_SECRET_MANAGEMENT_KEY_MAP = {
+    'automatic_management_enabled': 'automaticManagementEnabled',
+    'manual_management_reason': 'manualManagementReason',
+}
+
+# CPM actions: (endpoint, secretManagement time updated when the action completes)
+CPM_ACTIONS = {
+    'change': ('Change', 'lastModifiedTime'),
+    'verify': ('Verify', 'lastVerifiedTime'),
+    'reconcile': ('Reconcile', 'lastReconciledTime'),
+}
+
+# Final statuses of a bulk upload job
+BULK_JOB_DONE_STATUSES = ['completedsuccessfully', 'completedwitherrors', 'failed']
+
+# Maximum number of accounts submitted in a single bulk upload job
+BULK_BATCH_SIZE = 1000
+
+# Error of a bulk upload job's row for an account which already exists
+BULK_ROW_EXISTS = re.compile(r'already exists', re.IGNORECASE)
 
 
 # Build search parameter for GET /Accounts
@@ -32,67 +73,439 @@ def req_account_build_search_param(mod_parameters):
 
 
 # Build filter parameter for GET /Accounts
-# Eg: filter=safeName%20eq%20SSH_Keys
+# Eg: filter=safeName%20eq%20SSH_Keys%20AND%20modificationTime%20gte%201700000000
 def req_account_build_filter_param(mod_parameters):
+    filters = []
     if "safe" in mod_parameters and mod_parameters["safe"] is not None:
-        return "filter=" + quote("safeName eq ") + quote(mod_parameters["safe"])
-    else:
+        filters.append(quote("safeName eq ") + quote(mod_parameters["safe"]))
+
+    # Only return accounts modified since modified_since (Unix time)
+    if "modified_since" in mod_parameters and mod_parameters["modified_since"] is not None:
+        filters.append(quote("modificationTime gte ") + str(mod_parameters["modified_since"]))
+
+    if len(filters) == 0:
         return ''
 
+    return "filter=" + quote(" AND ").join(filters)
 
-# Search and return accounts. Support filters and search parameters
-def search_accounts(module):
-    cyberark_session = module.params["cyberark_session"]
 
-    # Authentication header
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": cyberark_session["token"],
-        "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-    }
+# Compile the mapper renaming, filtering and projecting accounts returned by GET /Accounts
+def compile_account_mapper(mod_parameters):
+    # The API search mechanism doesn't support filtering by secret_type, this has to be done here.
+    filters = {}
+    if 'secret_type' in mod_parameters and mod_parameters["secret_type"] is not None:
+        filters['secret_type'] = mod_parameters["secret_type"]
+
+    return compile_key_mapper(ACCOUNT_KEY_MAP, get_projection_fields(mod_parameters), filters)
+
+
+# Search accounts page by page. Support filters and search parameters
+# Yield dict(success=True, content=[accounts of the page]) per page, or the failed request's result
+def search_accounts_pages(mod_parameters):
+    cyberark_session = mod_parameters["cyberark_session"]
 
     # Craft URL
     api_base_url = cyberark_session["api_base_url"]
-    validate_certs = cyberark_session["validate_certs"]
     endpoint = "/PasswordVault/api/Accounts"
 
     # Get all accounts that match safe, platform, user and address
     url = req_get_build_url(api_base_url + endpoint,
-                            [req_account_build_search_param(module.params),
-                             req_account_build_filter_param(module.params)])
+                            [req_account_build_search_param(mod_parameters),
+                             req_account_build_filter_param(mod_parameters),
+                             "limit=" + str(PAGE_SIZE)])
+
+    return req_get_pages(cyberark_session, url, compile_account_mapper(mod_parameters))
+
+
+# Search and return accounts. Support filters and search parameters
+# transfer counts the bytes received and decoded (see req_add_transfer)
+def search_accounts(mod_parameters):
+    accounts = []
+    transfer = dict(compressed_bytes=0, uncompressed_bytes=0)
+    for page in search_accounts_pages(mod_parameters):
+        if not page['success']:
+            return page
+        accounts.extend(page['content'])
+        req_add_transfer(transfer, page)
+
+    return dict(success=True, content=accounts, transfer=transfer)
+
+
+# Search accounts in several safes with at most parallelism concurrent searches
+# Return the accounts merged in the order of safes and deduplicated by id, or the first failed search's result
+def search_accounts_in_safes(mod_parameters, safes, parallelism):
+    safes = list(dict.fromkeys(safes))
+    searches = bulk_run(lambda safe: search_accounts(dict(mod_parameters, safe=safe)), safes, parallelism)
+
+    accounts = []
+    account_ids = set()
+    transfer = dict(compressed_bytes=0, uncompressed_bytes=0)
+    for search in searches:
+        if not search['success']:
+            return search
+        req_add_transfer(transfer, search)
+        for account in search['content']:
+            if 'id' in account:
+                if account['id'] in account_ids:
+                    continue
+                account_ids.add(account['id'])
+            accounts.append(account)
+
+    return dict(success=True, content=accounts, transfer=transfer)
+
+
+# Search accounts in several safes page by page, safe after safe (see search_accounts_pages)
+def search_accounts_in_safes_pages(mod_parameters, safes):
+    for safe in dict.fromkeys(safes):
+        for page in search_accounts_pages(dict(mod_parameters, safe=safe)):
+            yield page
+            if not page['success']:
+                return
+
+
+# Get an account by id, on a persistent connection of pool if set (see ConnectionPool)
+def get_account_by_id(cyberark_session, account_id, pool=None):
+    url = cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id)
+
+    request = req_get_json(cyberark_session, url, pool)
+    if not request['success']:
+        return request
+
+    account = next(compile_key_mapper(ACCOUNT_KEY_MAP)([request['content']]))
+    return dict(success=True, code=request['code'], content=account)
+
+
+# Convert an account (collection's keys) to the body expected by POST /Accounts. None values are skipped
+def account_to_api(account):
+    api_account = {}
+    for key, value in account.items():
+        if value is None:
+            continue
+        if key == 'secret_management':
+            value = dict((API_SECRET_MANAGEMENT_KEY_MAP[sub_key] if sub_key in API_SECRET_MANAGEMENT_KEY_MAP
+                          else sub_key, sub_value) for sub_key, sub_value in value.items() if sub_value is not None)
+        api_account[API_ACCOUNT_KEY_MAP[key] if key in API_ACCOUNT_KEY_MAP else key] = value
+
+    return api_account
+
+
+# Request creating an account (collection's keys)
+def create_account_request(cyberark_session, account):
+    return dict(method="POST", success_codes=(201,), data=account_to_api(account),
+                url=cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts")
+
+
+# Result of an account creation request (see create_account)
+def create_account_result(created):
+    if not created['success']:
+        # 409 Conflict - Account already exists
+        if created['code'] == 409:
+            return dict(success=True, changed=False, code=created['code'], content=created['content'])
+        return dict(success=False, changed=False, code=created['code'], content=created['content'])
+
+    created_account = next(compile_key_mapper(ACCOUNT_KEY_MAP)([json.loads(created['content'])]))
+    return dict(success=True, changed=True, code=created['code'], content=created_account)
+
+
+# Create an account (collection's keys)
+# Return dict(success=True, changed=True, content=created account) or the failed request's result
+def create_account(cyberark_session, account):
+    request = create_account_request(cyberark_session, account)
+    return create_account_result(req_send(cyberark_session, request['method'], request['url'], request['data'],
+                                          success_codes=request['success_codes']))
+
+
+# Send requests concurrently with async_send_all, imported on first use: asyncio is slow to import and requires
+# Python 3.7. On older Pythons, requests are sent with threads (see req_send_all), without per_key limit.
+def send_all(cyberark_session, requests, concurrency, per_key=None):
+    if sys.version_info < (3, 7):
+        return req_send_all(cyberark_session, requests, concurrency.max_concurrency)
+
+    from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.async_request import async_send_all
+    return async_send_all(cyberark_session, requests, concurrency, per_key=per_key)
+
+
+# Create accounts (collection's keys) with concurrent requests, at most per_safe creations of a safe in flight
+# (see delete_accounts). After each chunk of creations, checkpoint(indexes of the accounts created or existing) and
+# progress(done, total, failed) are called. Return one result per account, in order, as create_account.
+def create_accounts(cyberark_session, accounts, concurrency, per_safe=None, checkpoint=None, progress=None):
+    if not isinstance(concurrency, AdaptiveConcurrency):
+        concurrency = AdaptiveConcurrency(concurrency, concurrency)
+
+    # Each chunk spans as many safes as possible
+    order = interleave(range(len(accounts)), lambda index: accounts[index]['safe'])
+
+    results = [None] * len(accounts)
+    failed = 0
+    chunk_size = concurrency.max_concurrency * 10
+    for chunk_start in range(0, len(order), chunk_size):
+        chunk = order[chunk_start:chunk_start + chunk_size]
+        created = send_all(cyberark_session,
+                           [dict(create_account_request(cyberark_session, accounts[index]),
+                                 key=accounts[index]['safe']) for index in chunk], concurrency, per_key=per_safe)
+        for index, result in zip(chunk, created):
+            results[index] = create_account_result(result)
+            if not results[index]['success']:
+                failed += 1
+
+        if checkpoint is not None:
+            checkpoint([index for index in chunk if results[index]['success']])
+        if progress is not None:
+            progress(chunk_start + len(chunk), len(accounts), failed)
+
+    return results
+
+
+# Create accounts (collection's keys) with bulk upload jobs of at most batch_size accounts, each job submitted once
+# the previous one finished. After each job, checkpoint(indexes of the accounts created or existing) and
+# progress(done, total, failed) are called, as in create_accounts.
+# Return dict(success=True, content=[one result per account, in order]). A job which cannot be submitted, fails or
+# times out fails the accounts of its batch only, except the first one: its failed request's result is returned.
+# A 404 or 405 code then means the bulk API isn't available.
+def bulk_create_accounts(cyberark_session, accounts, poll_interval=5, timeout=3600, batch_size=BULK_BATCH_SIZE,
+                         checkpoint=None, progress=None):
+    results = []
+    failed = 0
+    for batch_start in range(0, len(accounts), batch_size):
+        batch = accounts[batch_start:batch_start + batch_size]
+        created = bulk_create_batch(cyberark_session, batch, poll_interval, timeout)
+        if not created['success']:
+            if batch_start == 0:
+                return created
+            created['content'] = [dict(success=False, changed=False, content=created['content']) for account in batch]
 
+        results.extend(created['content'])
+        failed += len([result for result in created['content'] if not result['success']])
+        if checkpoint is not None:
+            checkpoint([batch_start + index for index, result in enumerate(created['content']) if result['success']])
+        if progress is not None:
+            progress(batch_start + len(batch), len(accounts), failed)
+
+    return dict(success=True, code=None, content=results)
+
+
+# Create accounts (collection's keys) with a single bulk upload job, then wait for the job to finish.
+# Return dict(success=True, content=[one result per account, in order]) or the failed request's result.
+def bulk_create_batch(cyberark_session, accounts, poll_interval=5, timeout=3600):
+    url = cyberark_session["api_base_url"] + "/PasswordVault/api/BulkActions/Accounts"
+
+    submitted = req_send(cyberark_session, "POST", url,
+                         dict(accountsList=[account_to_api(account) for account in accounts]),
+                         success_codes=(200, 201))
+    if not submitted['success']:
+        return submitted
+
+    # The job id is returned as a JSON string or number
+    job_id = json.loads(submitted['content'])
+    if isinstance(job_id, dict):
+        job_id = get_key_ci(job_id, 'id')
+
+    deadline = time.time() + timeout
+    while True:
+        job = req_get_json(cyberark_session, url + "/" + quote(str(job_id)))
+        if not job['success']:
+            return job
+
+        status = get_key_ci(job['content'], 'status', '')
+        if status.lower() in BULK_JOB_DONE_STATUSES:
+            break
+        if time.time() > deadline:
+            return dict(success=False, code=None,
+                        content="Bulk upload job %s timed out (status: %s)" % (job_id, status))
+        time.sleep(poll_interval)
+
+    # Map rows (numbered from 1) back to the accounts. Rows without a valid number are left without result
+    results = [dict(success=False, changed=False, content="No result for this account in bulk upload job %s" % job_id)
+               for account in accounts]
+    job_result = get_key_ci(job['content'], 'result', {})
+    for row in get_key_ci(job_result, 'succeeded', []):
+        index = bulk_row_index(row, len(accounts))
+        if index is not None:
+            results[index] = dict(success=True, changed=True, content=dict(id=get_key_ci(row, 'accountid')))
+    for row in get_key_ci(job_result, 'failed', []):
+        index = bulk_row_index(row, len(accounts))
+        if index is None:
+            continue
+        error = get_key_ci(row, 'errormessage', row)
+        # Account already exists: success without change, as a 409 in parallel mode (see create_account_result)
+        results[index] = dict(success=bulk_row_exists(error), changed=False, content=error)
+
+    return dict(success=True, code=job['code'], content=results)
+
+
+# Index of the account of a bulk upload job's row (numbered from 1), None if the row has no valid number
+def bulk_row_index(row, count):
     try:
-        response = open_url(
-            url,
-            method="GET",
-            headers=headers,
-            validate_certs=validate_certs,
-        )
-    except(HTTPError, HTTPException) as http_exception:
-        return dict(success=False, code=http_exception.getcode(), content=http_exception.read())
-
-    # Successful response
-    if response.getcode() != 200:
-        return dict(success=False, code=response.getcode(), content=response.read())
-
-    resp_data = json.loads(response.read())
-    accounts = resp_data["value"] if 'value' in resp_data else []
-
-    account_key_map = {
-        'categoryModificationTime': 'modified_time',
-        'createdTime': 'created_time',
-        'secretType': 'secret_type',
-        'platformAccountProperties': 'platform_account_properties',
-        'platformId': 'platform_id',
-        'safeName': 'safe',
-        'secretManagement': 'secret_management',
-        'userName': 'username'
-    }
-    accounts = rename_keys(account_key_map, accounts)
-
-    # Filter found accounts by secret_type
-    # The API search mechanism doesn't support filtering by secret_type, this has to be done here.
-    if 'secret_type' in module.params and module.params["secret_type"] is not None:
-        accounts = filter_objects_by(accounts, 'secret_type', module.params["secret_type"])
+        index = int(get_key_ci(row, 'rownumber')) - 1
+    except (TypeError, ValueError):
+        return None
+
+    return index if 0 <= index < count else None
+
+
+# Whether the error of a bulk upload job's row means the account already exists
+def bulk_row_exists(error):
+    return BULK_ROW_EXISTS.search(str(error)) is not None
+
+
+# Return JSON-Patch operations (RFC 6902) turning existing account into desired account (collection's keys).
+# Only the keys set (not None) in desired are compared.
+def account_build_patch(existing, desired):
+    operations = []
+    for key in ['name', 'address', 'username', 'platform_id']:
+        if key not in desired or desired[key] is None:
+            continue
+        if key not in existing or existing[key] != desired[key]:
+            operations.append(dict(op='replace', path='/' + API_ACCOUNT_KEY_MAP.get(key, key), value=desired[key]))
+
+    # Platform properties are returned as strings by PAM
+    existing_properties = existing['platform_account_properties'] \
+        if 'platform_account_properties' in existing and existing['platform_account_properties'] else {}
+    desired_properties = desired['platform_account_properties'] \
+        if 'platform_account_properties' in desired and desired['platform_account_properties'] else {}
+    for key, value in desired_properties.items():
+        if value is None:
+            if key in existing_properties:
+                operations.append(dict(op='remove', path='/platformAccountProperties/' + key))
+        elif key not in existing_properties:
+            operations.append(dict(op='add', path='/platformAccountProperties/' + key, value=value))
+        elif str(existing_properties[key]) != str(value):
+            operations.append(dict(op='replace', path='/platformAccountProperties/' + key, value=value))
+
+    existing_management = existing['secret_management'] \
+        if 'secret_management' in existing and existing['secret_management'] else {}
+    desired_management = desired['secret_management'] \
+        if 'secret_management' in desired and desired['secret_management'] else {}
+    for key, value in desired_management.items():
+        api_key = API_SECRET_MANAGEMENT_KEY_MAP[key]
+        if value is None or (api_key in existing_management and existing_management[api_key] == value):
+            continue
+        operations.append(dict(op='replace', path='/secretManagement/' + api_key, value=value))
+
+    return operations
+
+
+# Apply JSON-Patch operations to an account
+# Return dict(success=True, content=updated account) or the failed request's result
+def patch_account(cyberark_session, account_id, operations):
+    url = cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id)
+
+    patched = req_send(cyberark_session, "PATCH", url, operations, success_codes=(200,))
+    if not patched['success']:
+        return patched
+
+    patched_account = next(compile_key_mapper(ACCOUNT_KEY_MAP)([json.loads(patched['content'])]))
+    return dict(success=True, code=patched['code'], content=patched_account)
+
+
+# Set the secret of an account
+def update_account_secret(cyberark_session, account_id, secret):
+    url = cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id) + "/Password/Update"
+
+    return req_send(cyberark_session, "POST", url, dict(NewCredentials=secret), success_codes=(200, 204))
+
+
+# Request retrieving the secret (password or ssh key) of an account. The reason is recorded in PAM's audit
+def retrieve_account_secret_request(cyberark_session, account_id, reason):
+    return dict(method="POST", data=dict(reason=reason),
+                url=(cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id)
+                     + "/Password/Retrieve"))
+
+
+# Ask CPM to change, verify or reconcile the secret of an account. CPM processes it asynchronously
+def trigger_cpm_action(cyberark_session, account_id, action, pool=None):
+    url = (cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id) + "/"
+           + CPM_ACTIONS[action][0])
+
+    data = dict(ChangeEntireGroup=False) if action == 'change' else None
+    return req_send(cyberark_session, "POST", url, data, success_codes=(200, 204), pool=pool)
+
+
+# Compare the secret management of an account before and after a CPM action
+# Return 'succeeded', 'failed' or None while the action is pending
+def cpm_action_status(action, before, after):
+    time_key = CPM_ACTIONS[action][1]
+    if after.get(time_key) is not None and after.get(time_key) != before.get(time_key):
+        return 'succeeded' if after.get('status') != 'failure' else 'failed'
+    if after.get('status') == 'failure' and after != before:
+        return 'failed'
+
+    return None
+
+
+# Request deleting an account through the Accounts API, or the legacy API (see delete_account)
+# A 404 code means the account is already deleted
+def delete_account_request(cyberark_session, account_id, legacy=False):
+    if legacy:
+        return dict(method="DELETE", success_codes=(200, 404),
+                    url=(cyberark_session["api_base_url"] + "/PasswordVault/WebServices/PIMServices.svc/Accounts/"
+                         + quote(account_id)))
+
+    return dict(method="DELETE", success_codes=(204, 404),
+                url=cyberark_session["api_base_url"] + "/PasswordVault/api/Accounts/" + quote(account_id))
+
+
+# Whether a deletion refused by the Accounts API must be retried with the legacy API
+def delete_account_needs_legacy(deleted):
+    return not deleted['success'] and deleted['code'] not in (None, 401, 403)
+
+
+# Delete an account, whatever its secret type, through the Accounts API
+# Fall back to the legacy API when the Accounts API refuses the deletion (e.g. ssh keys on older PVWA)
+# A 404 code means the account is already deleted: success without change
+def delete_account(cyberark_session, account_id):
+    request = delete_account_request(cyberark_session, account_id)
+    deleted = req_send(cyberark_session, request['method'], request['url'], success_codes=request['success_codes'])
+    if delete_account_needs_legacy(deleted):
+        request = delete_account_request(cyberark_session, account_id, legacy=True)
+        deleted = req_send(cyberark_session, request['method'], request['url'],
+                           success_codes=request['success_codes'])
+
+    return dict(deleted, changed=deleted['success'] and deleted['code'] != 404)
+
+
+# Delete accounts (dict(id, safe)) with concurrent requests, concurrency being a number or an AdaptiveConcurrency
+# (see send_all). PAM serializes the writes in a safe: at most per_safe deletions of a safe are in flight, the
+# others going to the other safes. After each chunk of deletions, checkpoint(deleted accounts) and
+# progress(done, total, failed) are called.
+# Return dict(success, content=dict(found, deleted, missing, failed=[dict(id, code, response)])), missing counting the
+# accounts already deleted (404), included in deleted
+def delete_accounts(cyberark_session, accounts, concurrency, per_safe=None, progress=None, checkpoint=None):
+    if not isinstance(concurrency, AdaptiveConcurrency):
+        concurrency = AdaptiveConcurrency(concurrency, concurrency)
+
+    # Each chunk spans as many safes as possible
+    accounts = interleave(accounts, lambda account: account['safe'])
+
+    purged = dict(found=len(accounts), deleted=0, missing=0, failed=[])
+    chunk_size = concurrency.max_concurrency * 10
+    for chunk_start in range(0, len(accounts), chunk_size):
+        chunk = accounts[chunk_start:chunk_start + chunk_size]
+        deletions = send_all(cyberark_session,
+                             [dict(delete_account_request(cyberark_session, account['id']), key=account['safe'])
+                              for account in chunk], concurrency, per_key=per_safe)
+
+        # Deletions refused by the Accounts API are retried with the legacy API
+        legacy = [index for index, deleted in enumerate(deletions) if delete_account_needs_legacy(deleted)]
+        if len(legacy) > 0:
+            legacy_deletions = send_all(cyberark_session,
+                                        [dict(delete_account_request(cyberark_session, chunk[index]['id'],
+                                                                     legacy=True), key=chunk[index]['safe'])
+                                         for index in legacy], concurrency, per_key=per_safe)
+            for index, deleted in zip(legacy, legacy_deletions):
+                deletions[index] = deleted
+
+        for account, deleted in zip(chunk, deletions):
+            if deleted['success']:
+                purged['deleted'] += 1
+                if deleted['code'] == 404:
+                    purged['missing'] += 1
+            else:
+                purged['failed'].append(dict(id=account['id'], code=deleted['code'], response=deleted['content']))
+
+        if checkpoint is not None:
+            checkpoint([account for account, deleted in zip(chunk, deletions) if deleted['success']])
+        if progress is not None:
+            progress(chunk_start + len(chunk), len(accounts), len(purged['failed']))
 
-    return dict(success=True, content=accounts)
+    return dict(success=len(purged['failed']) == 0, content=purged)
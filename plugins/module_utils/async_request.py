@@ -0,0 +1,227 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import asyncio
+import json
+import time
+
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import AdaptiveConcurrency, KeyScheduler
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import (CANCELLED, req_build_headers,
+                                                                                req_send_all, req_ssl_context,
+                                                                                req_use_proxy, REQUEST_TIMEOUT)
+
+# Number of times a request throttled by PAM (429, 503) is sent again, first after THROTTLED_DELAY seconds,
+# doubled after each attempt
+THROTTLED_RETRIES = 3
+THROTTLED_DELAY = 0.5
+
+
+# A kept-alive connection was closed by the server before it got the request: the request can be sent again
+class StaleConnection(ConnectionError):
+    pass
+
+
+# Persistent connections to PAM for asyncio, at most per_host connections per host
+class AsyncConnectionPool:
+
+    def __init__(self, cyberark_session, per_host, timeout=REQUEST_TIMEOUT):
+        self.cyberark_session = cyberark_session
+        self.per_host = per_host
+        self.timeout = timeout
+        self.idle = {}
+        self.slots = {}
+        self.ssl_context = None
+
+    async def connect(self, parsed_url):
+        if parsed_url.scheme != 'https':
+            return await asyncio.open_connection(parsed_url.hostname, parsed_url.port or 80)
+
+        if self.ssl_context is None:
+            self.ssl_context = req_ssl_context(self.cyberark_session)
+        return await asyncio.open_connection(parsed_url.hostname, parsed_url.port or 443, ssl=self.ssl_context)
+
+    # Send a request and return dict(success, code, content) as req_send
+    async def send(self, method, url, data=None, success_codes=(200,)):
+        parsed_url = urlparse(url)
+        # Created on first use, in the running event loop
+        slots = self.slots.setdefault(parsed_url.netloc, asyncio.Semaphore(self.per_host))
+        idle = self.idle.setdefault(parsed_url.netloc, [])
+
+        async with slots:
+            connection = idle.pop() if len(idle) > 0 else None
+            # An idle connection may have been closed by the server meanwhile: retry once with a new one.
+            # Only a request PAM did not get is sent again (see StaleConnection): after a timeout or a partial
+            # response, PAM may have processed it already.
+            for reused in ([True, False] if connection is not None else [False]):
+                try:
+                    if not reused:
+                        connection = None
+                        connection = await asyncio.wait_for(self.connect(parsed_url), self.timeout)
+                    code, content, keep_alive = await asyncio.wait_for(
+                        self.exchange(connection, method, parsed_url, data), self.timeout)
+                except StaleConnection as network_exception:
+                    connection[1].close()
+                    if reused:
+                        continue
+                    return dict(success=False, code=None, content=str(network_exception))
+                except (OSError, EOFError, ValueError, asyncio.TimeoutError) as network_exception:
+                    if connection is not None:
+                        connection[1].close()
+                    return dict(success=False, code=None,
+                                content=str(network_exception) or type(network_exception).__name__)
+
+                if keep_alive:
+                    idle.append(connection)
+                else:
+                    connection[1].close()
+
+                return dict(success=code in success_codes, code=code, content=content)
+
+    # Write an HTTP/1.1 request on connection and read its response
+    # Return (status code, body, whether the connection can be reused)
+    async def exchange(self, connection, method, parsed_url, data):
+        reader, writer = connection
+
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        path = parsed_url.path + ('?' + parsed_url.query if parsed_url.query else '')
+        headers = dict(req_build_headers(self.cyberark_session), Host=parsed_url.netloc)
+        headers['Content-Length'] = str(len(body))
+        head = method + " " + path + " HTTP/1.1\r\n" + "".join("%s: %s\r\n" % header for header in headers.items())
+        try:
+            writer.write(head.encode('latin-1') + b"\r\n" + body)
+            await writer.drain()
+        except OSError as write_exception:
+            raise StaleConnection(str(write_exception) or type(write_exception).__name__)
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise StaleConnection("Remote end closed connection without response")
+        version, code = status_line.split(None, 2)[:2]
+        code = int(code)
+
+        response_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, value = line.decode('latin-1').split(':', 1)
+            response_headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == b"HTTP/1.1" and response_headers.get('connection', '').lower() != 'close'
+        if method == "HEAD" or code in (204, 304):
+            content = b""
+        elif response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            content = await self.read_chunked(reader)
+        elif 'content-length' in response_headers:
+            content = await reader.readexactly(int(response_headers['content-length']))
+        else:
+            # The body ends with the connection
+            content = await reader.read()
+            keep_alive = False
+
+        return code, content, keep_alive
+
+    async def read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";", 1)[0], 16)
+            if size == 0:
+                # Skip trailers
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    def close(self):
+        for idle in self.idle.values():
+            for reader, writer in idle:
+                writer.close()
+        self.idle = {}
+
+
+# Send requests concurrently from a single thread with asyncio.
+# concurrency is the number of requests in flight: a number, or an AdaptiveConcurrency adapting it to PAM's latency
+# and errors. Requests throttled by PAM (429, 503) are sent again up to THROTTLED_RETRIES times, after a pause.
+# per_host bounds the connections per host (maximum concurrency by default).
+# requests are dict(method, url, data=None, success_codes=(200,), key=None). Requests are sent round robin between
+# their keys (eg. the safe they write to), with at most per_key requests of a key in flight (see KeyScheduler).
+# Return the results in the order of requests, dict(success, code, content) as req_send.
+# Cancellation is cooperative: once cancel (a threading.Event) is set, or a request failed with stop_on_failure,
+# requests not sent yet get dict(success=False, code=None, content=CANCELLED). Requests in flight complete.
+# With a proxy or the httpapi connection, requests go through req_send_all's threads instead.
+def async_send_all(cyberark_session, requests, concurrency=100, per_host=None, per_key=None, timeout=REQUEST_TIMEOUT,
+                   cancel=None, stop_on_failure=False):
+    if not isinstance(concurrency, AdaptiveConcurrency):
+        concurrency = AdaptiveConcurrency(concurrency, concurrency)
+
+    if 'socket_path' in cyberark_session or req_use_proxy(cyberark_session["api_base_url"]):
+        return req_send_all(cyberark_session, requests, concurrency.max_concurrency, timeout, cancel, stop_on_failure)
+
+    results = [None] * len(requests)
+    failed = []
+
+    def stopped():
+        return len(failed) > 0 or (cancel is not None and cancel.is_set())
+
+    def record(index, result):
+        results[index] = result
+        if stop_on_failure and not result['success']:
+            failed.append(index)
+
+    async def send_all():
+        pool = AsyncConnectionPool(cyberark_session, per_host or concurrency.max_concurrency, timeout)
+        scheduler = KeyScheduler([request.get('key') for request in requests], per_key)
+        in_flight = [0]
+        slot_freed = asyncio.Condition()
+
+        async def send(request):
+            for attempt in range(THROTTLED_RETRIES + 1):
+                # Wait for a free slot: the concurrency may have been reduced meanwhile
+                async with slot_freed:
+                    await slot_freed.wait_for(lambda: in_flight[0] < concurrency.limit)
+                    in_flight[0] += 1
+
+                started = time.time()
+                result = await pool.send(request['method'], request['url'], request.get('data'),
+                                         request.get('success_codes', (200,)))
+                concurrency.record(time.time() - started, result['code'])
+
+                async with slot_freed:
+                    in_flight[0] -= 1
+                    slot_freed.notify_all()
+
+                if result['code'] not in (429, 503) or attempt == THROTTLED_RETRIES:
+                    return result
+                await asyncio.sleep(THROTTLED_DELAY * 2 ** attempt)
+
+        # Each worker sends one request at a time, the next one given by the scheduler
+        async def worker():
+            while True:
+                async with slot_freed:
+                    index = scheduler.take()
+                    while index is None and not scheduler.finished():
+                        await slot_freed.wait()
+                        index = scheduler.take()
+                if index is None:
+                    return
+
+                if stopped():
+                    record(index, dict(success=False, code=None, content=CANCELLED))
+                else:
+                    record(index, await send(requests[index]))
+
+                async with slot_freed:
+                    scheduler.release(index)
+                    slot_freed.notify_all()
+
+        try:
+            await asyncio.gather(*[worker() for worker_index in range(min(concurrency.max_concurrency,
+                                                                          len(requests)))])
+        finally:
+            pool.close()
+
+    asyncio.run(send_all())
+    return results
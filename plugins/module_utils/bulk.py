@@ -0,0 +1,158 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Call func on each item with at most parallelism concurrent calls.
+# Return the results in the order of items.
+def bulk_run(func, items, parallelism):
+    if parallelism <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=parallelism) as executor:
+        return list(executor.map(func, items))
+
+
+# Reorder items round robin between their keys (eg. their safe): the first item of each key, then the second...
+# Items of a key keep their order.
+def interleave(items, key):
+    groups = OrderedDict()
+    for item in items:
+        groups.setdefault(key(item), deque()).append(item)
+
+    interleaved = []
+    while len(groups) > 0:
+        for group_key in list(groups):
+            interleaved.append(groups[group_key].popleft())
+            if len(groups[group_key]) == 0:
+                del groups[group_key]
+
+    return interleaved
+
+
+# Order in which the requests of a bulk operation are sent: round robin between their keys (eg. the safe they
+# write to), with at most per_key requests of a key in flight (no limit when None). PAM serializes the writes in a
+# safe, so concurrent requests are better spent on other safes.
+# Requests are identified by their index in keys. Requests of a key are taken in order, requests without key
+# (None) are not limited.
+class KeyScheduler:
+
+    def __init__(self, keys, per_key=None):
+        self.keys = keys
+        self.per_key = per_key
+        self.pending = OrderedDict()
+        for index, key in enumerate(keys):
+            self.pending.setdefault(key, deque()).append(index)
+        self.in_flight = {}
+
+    # Whether all the requests were taken
+    def finished(self):
+        return len(self.pending) == 0
+
+    # Take the next request, from the next key with less than per_key requests in flight
+    # Return None when there is none
+    def take(self):
+        for key in list(self.pending):
+            if key is not None and self.per_key is not None and self.in_flight.get(key, 0) >= self.per_key:
+                continue
+
+            queue = self.pending[key]
+            index = queue.popleft()
+            if len(queue) > 0:
+                self.pending.move_to_end(key)
+            else:
+                del self.pending[key]
+            self.in_flight[key] = self.in_flight.get(key, 0) + 1
+            return index
+
+        return None
+
+    # A request taken is completed
+    def release(self, index):
+        self.in_flight[self.keys[index]] -= 1
+
+
+# Least number of requests completed between two adjustments of AdaptiveConcurrency
+ADAPTIVE_MIN_WINDOW = 10
+
+# Share of failed requests (network errors, 429 and 5xx) over which AdaptiveConcurrency halves the concurrency
+ADAPTIVE_ERROR_RATE = 0.05
+
+
+# Number of concurrent requests of a bulk operation, adapted to PAM's latency and errors between
+# min_concurrency and max_concurrency (AIMD). Fixed when both are equal.
+# Starts at min_concurrency and doubles after each window of requests (slow start) until PAM shows load:
+# - more than ADAPTIVE_ERROR_RATE of the requests failed with a network error, 429 or 5xx: halve
+# - the p95 latency exceeds latency_tolerance times the lowest p95 seen: reduce by a quarter
+# - otherwise, grow by one request per window once the slow start is over
+# A window is max(concurrency, ADAPTIVE_MIN_WINDOW) completed requests. The object is shared by the successive
+# bulk requests (eg. the chunks of a purge) so they start from the concurrency reached.
+class AdaptiveConcurrency:
+
+    def __init__(self, min_concurrency, max_concurrency, latency_tolerance=2.0):
+        self.min_concurrency = max(min_concurrency, 1)
+        self.max_concurrency = max(max_concurrency, self.min_concurrency)
+        self.latency_tolerance = latency_tolerance
+        self.limit = self.min_concurrency
+        self.slow_start = True
+
+        self.latencies = []
+        self.errors = 0
+        self.base_latency = None
+        self.p95_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.decreases = 0
+
+    # Record a completed request: its latency in seconds and its HTTP code (None on network errors)
+    def record(self, latency, code):
+        self.requests += 1
+        self.latencies.append(latency)
+        if code is None or code == 429 or code >= 500:
+            self.errors += 1
+        if code in (429, 503):
+            self.throttled += 1
+
+        if len(self.latencies) < max(self.limit, ADAPTIVE_MIN_WINDOW):
+            return
+
+        latencies = sorted(self.latencies)
+        self.p95_latency = latencies[int(0.95 * (len(latencies) - 1))]
+        # The reference latency may slowly rise, PAM's load changes over time
+        if self.base_latency is None or self.p95_latency < self.base_latency:
+            self.base_latency = self.p95_latency
+        else:
+            self.base_latency *= 1.05
+
+        if self.min_concurrency == self.max_concurrency:
+            pass
+        elif self.errors > ADAPTIVE_ERROR_RATE * len(self.latencies):
+            self.decrease(0.5)
+        elif self.p95_latency > self.latency_tolerance * self.base_latency:
+            self.decrease(0.75)
+        elif self.slow_start:
+            self.limit = min(self.limit * 2, self.max_concurrency)
+        else:
+            self.limit = min(self.limit + 1, self.max_concurrency)
+
+        self.latencies = []
+        self.errors = 0
+
+    def decrease(self, factor):
+        self.slow_start = False
+        self.decreases += 1
+        self.limit = max(int(self.limit * factor), self.min_concurrency)
+
+    # Summary returned by modules
+    def stats(self):
+        return dict(
+            concurrency=self.limit,
+            min_concurrency=self.min_concurrency,
+            max_concurrency=self.max_concurrency,
+            p95_latency=round(self.p95_latency, 3) if self.p95_latency is not None else None,
+            requests=self.requests,
+            throttled=self.throttled,
+            decreases=self.decreases,
+        )
@@ -1,26 +1,64 @@
 # Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-# Rename accounts' keys to key_map keys
-def rename_keys(key_map, accounts):
-    out_accounts = []
-    for account in accounts:
-        # Create a copy we can modify
-        out_account = account.copy()
-        for key in account:
-            if key in key_map:
-                out_account[key_map[key]] = out_account.pop(key)
-        # Output modified account
-        out_accounts.append(out_account)
-
-    return out_accounts
-
-
-# Return objects with object[key] == value
-def filter_objects_by(objects, key, value):
-    out_objects = []
-    for account in objects:
-        if value == account[key]:
-            out_objects.append(account)
-
-    return out_objects
+# Compile a mapper renaming, filtering and projecting objects in a single pass.
+# key_map: API key -> returned key (Eg: {'userName': 'username'})
+# fields: returned keys to keep, None to keep all keys
+# filters: returned key -> expected value, objects not matching are skipped before being copied
+# The mapper takes an iterable of objects and returns a generator of mapped objects.
+def compile_key_mapper(key_map, fields=None, filters=None):
+    reverse_key_map = dict((out_key, key) for key, out_key in key_map.items())
+
+    # Resolve filters on API keys so that they are matched on the original objects
+    api_filters = []
+    if filters is not None:
+        for out_key, value in filters.items():
+            api_filters.append((reverse_key_map[out_key] if out_key in reverse_key_map else out_key, value))
+
+    # Resolve projected fields to (API key, returned key) pairs
+    projection = None
+    if fields is not None:
+        projection = []
+        for field in fields:
+            if field in reverse_key_map:
+                projection.append((reverse_key_map[field], field))
+            elif field not in key_map:
+                projection.append((field, field))
+
+    def map_object(obj):
+        if projection is None:
+            return dict((key_map[key] if key in key_map else key, value) for key, value in obj.items())
+
+        return dict((out_key, obj[key]) for key, out_key in projection if key in obj)
+
+    def mapper(objects):
+        for obj in objects:
+            if all(key in obj and obj[key] == value for key, value in api_filters):
+                yield map_object(obj)
+
+    return mapper
+
+
+# Return obj[key] matching key case-insensitively, default if there is no such key
+def get_key_ci(obj, key, default=None):
+    for obj_key in obj:
+        if obj_key.lower() == key.lower():
+            return obj[obj_key]
+
+    return default
+
+
+# Return the fields to keep in returned objects according to fields, ids_only and count_only parameters
+# None means all fields are kept
+def get_projection_fields(mod_parameters):
+    if "count_only" in mod_parameters and mod_parameters["count_only"]:
+        return []
+
+    if "ids_only" in mod_parameters and mod_parameters["ids_only"]:
+        return ["id"]
+
+    if "fields" in mod_parameters and mod_parameters["fields"]:
+        # Objects are always identified by their id
+        return set(mod_parameters["fields"]) | {"id"}
+
+    return None
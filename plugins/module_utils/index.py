@@ -0,0 +1,84 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+import os
+import sqlite3
+
+from ansible.module_utils.six.moves.urllib.request import pathname2url
+
+# Account columns which can be queried, all of them are indexed
+ACCOUNT_INDEXED_COLUMNS = ['safe', 'username', 'address', 'platform_id', 'secret_type', 'name']
+
+# Safe columns which can be queried
+SAFE_INDEXED_COLUMNS = ['name', 'cpm']
+
+INDEX_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS accounts (id TEXT PRIMARY KEY, safe TEXT, username TEXT, address TEXT, "
+    "platform_id TEXT, secret_type TEXT, name TEXT, modified_time INTEGER, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS safes (id TEXT PRIMARY KEY, name TEXT, cpm TEXT, data TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS sync_state (safe TEXT PRIMARY KEY, high_water_mark INTEGER)",
+] + ["CREATE INDEX IF NOT EXISTS accounts_%s ON accounts (%s)" % (column, column)
+     for column in ACCOUNT_INDEXED_COLUMNS]
+
+
+# Open the index database, creating the schema if needed
+# With read_only, the database must exist and is neither created nor modified
+def index_connect(path, read_only=False):
+    if read_only:
+        return sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(path)), uri=True)
+
+    connection = sqlite3.connect(path)
+    for statement in INDEX_SCHEMA:
+        connection.execute(statement)
+
+    return connection
+
+
+# Return the accounts (id -> account) and the high-water mark of a safe
+def index_get_safe_snapshot(connection, safe):
+    accounts = dict((row[0], json.loads(row[1])) for row in
+                    connection.execute("SELECT id, data FROM accounts WHERE safe = ?", (safe,)))
+    row = connection.execute("SELECT high_water_mark FROM sync_state WHERE safe = ?", (safe,)).fetchone()
+
+    return accounts, (row[0] if row is not None else None)
+
+
+# Insert or replace accounts and delete removed accounts of a safe
+def index_apply_safe_delta(connection, safe, upserted_accounts, removed_accounts, high_water_mark):
+    connection.executemany(
+        "INSERT OR REPLACE INTO accounts (id, safe, username, address, platform_id, secret_type, name, "
+        "modified_time, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((account['id'],) + tuple(account[column] if column in account else None
+                                  for column in ACCOUNT_INDEXED_COLUMNS + ['modified_time'])
+         + (json.dumps(account),) for account in upserted_accounts))
+    connection.executemany("DELETE FROM accounts WHERE id = ?", ((account['id'],) for account in removed_accounts))
+    connection.execute("INSERT OR REPLACE INTO sync_state (safe, high_water_mark) VALUES (?, ?)",
+                       (safe, high_water_mark))
+
+
+# Replace all indexed safes
+def index_replace_safes(connection, safes):
+    connection.execute("DELETE FROM safes")
+    connection.executemany(
+        "INSERT INTO safes (id, name, cpm, data) VALUES (?, ?, ?, ?)",
+        ((safe['id'], safe['name'] if 'name' in safe else None, safe['cpm'] if 'cpm' in safe else None,
+          json.dumps(safe)) for safe in safes))
+
+
+# Query accounts or safes matching all criteria (column -> value)
+def index_query(connection, table, criteria):
+    if table not in ['accounts', 'safes']:
+        raise ValueError("Unknown table %s, valid tables are: accounts, safes" % table)
+
+    columns = ACCOUNT_INDEXED_COLUMNS if table == 'accounts' else SAFE_INDEXED_COLUMNS
+    for column in criteria:
+        if column not in columns + ['id']:
+            raise ValueError("Column %s can't be queried in %s, valid columns are: %s"
+                             % (column, table, ', '.join(columns + ['id'])))
+
+    query = "SELECT data FROM %s" % table
+    if len(criteria) > 0:
+        query += " WHERE " + " AND ".join("%s = ?" % column for column in criteria)
+
+    return [json.loads(row[0]) for row in connection.execute(query, tuple(criteria.values()))]
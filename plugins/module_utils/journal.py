@@ -0,0 +1,74 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+import os
+
+# Journal of a bulk operation, a JSON lines file resuming the operation after a failure.
+# The first line describes the operation and its items, each following line lists keys of completed items.
+# Eg: {"operation": {"module": "delete_safe", "safe": "Linux_Passwords"}, "items": [{"id": "25_21", ...}, ...]}
+#     {"done": ["25_21", "25_22"]}
+# Secrets are never written to the journal.
+
+
+# Load the journal of operation
+# Return None when there is no journal, dict(items, done=set of completed keys) otherwise.
+# Raise ValueError when the journal belongs to another operation.
+def load_journal(path, operation):
+    if not os.path.exists(path):
+        return None
+
+    with open(path, 'r') as journal_file:
+        lines = journal_file.read().splitlines()
+
+    if len(lines) == 0:
+        return None
+
+    header = json.loads(lines[0])
+    if header['operation'] != operation:
+        raise ValueError("Journal %s belongs to another operation: %s" % (path, json.dumps(header['operation'])))
+
+    done = set()
+    for index, line in enumerate(lines[1:]):
+        try:
+            done.update(json.loads(line)['done'])
+        except ValueError:
+            # The last line may have been partially written when the module was stopped
+            if index < len(lines) - 2:
+                raise
+
+    return dict(items=header['items'], done=done)
+
+
+# Create the journal of operation, replacing any existing one
+def start_journal(path, operation, items):
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as journal_file:
+        journal_file.write(json.dumps(dict(operation=operation, items=items)) + "\n")
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+
+# Record keys of completed items. They are on disk when the function returns.
+def record_journal(path, keys):
+    if len(keys) == 0:
+        return
+
+    with open(path, 'a') as journal_file:
+        journal_file.write(json.dumps(dict(done=list(keys))) + "\n")
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+
+
+# Callback recording key(item) of the completed items (see delete_accounts' checkpoint), None without journal
+def journal_checkpoint(path, key):
+    if path is None:
+        return None
+
+    return lambda items: record_journal(path, [key(item) for item in items])
+
+
+# Remove the journal of a completed operation
+def remove_journal(path):
+    if os.path.exists(path):
+        os.unlink(path)
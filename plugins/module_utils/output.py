@@ -0,0 +1,49 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import gzip
+import json
+import os
+import tempfile
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_add_transfer
+
+
+# Write the objects of pages (dict(success, content=[objects]), see req_get_pages) to a gzip compressed JSON lines
+# file, one object per line, as the pages are fetched: only one page is kept in memory.
+# The file is replaced atomically once all the pages are written, it is left untouched on failure.
+# With dry_run, the objects are counted but not written.
+# Return dict(success=True, content=number of objects, transfer=bytes received and decoded (see req_add_transfer))
+# or the failed page's result
+def write_pages_jsonl_gzip(path, pages, dry_run=False):
+    transfer = dict(compressed_bytes=0, uncompressed_bytes=0)
+    if dry_run:
+        count = 0
+        for page in pages:
+            if not page['success']:
+                return page
+            count += len(page['content'])
+            req_add_transfer(transfer, page)
+        return dict(success=True, content=count, transfer=transfer)
+
+    output_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, prefix='.' + os.path.basename(path) + '-')
+    try:
+        count = 0
+        with os.fdopen(fd, 'wb') as output_file:
+            with gzip.GzipFile(fileobj=output_file, mode='wb') as gzip_file:
+                for page in pages:
+                    if not page['success']:
+                        os.unlink(tmp_path)
+                        return page
+                    gzip_file.write(''.join(json.dumps(obj) + '\n' for obj in page['content']).encode('utf-8'))
+                    count += len(page['content'])
+                    req_add_transfer(transfer, page)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    return dict(success=True, content=count, transfer=transfer)
@@ -0,0 +1,76 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import glob
+import json
+import os
+import re
+import time
+
+# Minimum number of seconds between two writes of the progress of a job
+PROGRESS_INTERVAL = 1.0
+
+
+# Status file of the Ansible async job running the module, None when the module doesn't run with async.
+# Ansible's async_wrapper runs the module in a child process and writes the job's status file
+# (<ANSIBLE_ASYNC_DIR>/<jid>.<pid>), the jid being one of its arguments. It sets ANSIBLE_ASYNC_DIR for async tasks.
+# The arguments of the parent process are read from /proc (Linux).
+def async_job_path():
+    async_dir = os.environ.get('ANSIBLE_ASYNC_DIR')
+    if async_dir is None:
+        return None
+
+    try:
+        with open('/proc/%d/cmdline' % os.getppid(), 'rb') as cmdline_file:
+            args = cmdline_file.read().decode('utf-8', 'replace').split('\0')
+    except (IOError, OSError):
+        return None
+
+    for index, arg in enumerate(args[:-1]):
+        if 'async_wrapper' not in os.path.basename(arg):
+            continue
+
+        jid = args[index + 1]
+        jobs = [path for path in glob.glob(os.path.join(os.path.expanduser(async_dir), glob.escape(jid) + '.*'))
+                if re.match(r'^\d+$', os.path.basename(path)[len(jid) + 1:])]
+        return jobs[0] if len(jobs) == 1 else None
+
+    return None
+
+
+# Progress of a bulk operation run with Ansible's async (async, poll), written to the job's status file.
+# async_status returns it while the job runs, with started and finished as usual. Eg:
+# {"started": true, "finished": false, "ansible_job_id": "j123.456",
+#  "progress": {"done": 2000, "total": 10000, "failed": 3, "rate": 85.2, "elapsed": 23.5}}
+# The status file is replaced by the module's result when it ends. Without async, updates are ignored.
+class JobProgress:
+
+    def __init__(self, job_path=None):
+        self.job_path = job_path if job_path is not None else async_job_path()
+        self.started = time.time()
+        self.written = None
+
+    # done items out of total, failed of them failed
+    def update(self, done, total, failed=0):
+        if self.job_path is None:
+            return
+
+        now = time.time()
+        if self.written is not None and done < total and now - self.written < PROGRESS_INTERVAL:
+            return
+        self.written = now
+
+        elapsed = now - self.started
+        status = dict(started=True, finished=False, ansible_job_id=os.path.basename(self.job_path),
+                      progress=dict(done=done, total=total, failed=failed, elapsed=round(elapsed, 1),
+                                    rate=round(done / elapsed, 1) if elapsed > 0 else None))
+
+        # Replaced atomically, async_status may read it meanwhile
+        tmp_path = self.job_path + '.progress'
+        try:
+            with open(tmp_path, 'w') as status_file:
+                json.dump(status, status_file)
+            os.rename(tmp_path, self.job_path)
+        except (IOError, OSError):
+            # The progress is informative, the operation goes on
+            self.job_path = None
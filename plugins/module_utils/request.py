@@ -1,13 +1,489 @@
 # Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
+import codecs
+import io
+import json
+import threading
+import zlib
+
+from ansible.module_utils.common.text.converters import to_bytes, to_text
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.http_client import HTTPException
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import bulk_run
+
+# ansible.module_utils.urls (open_url), ssl and the httpapi connection are imported when used: importing urls alone
+# takes about 40 ms, paid by every module run otherwise, even those answered from a cache or the httpapi connection.
+
+# Number of objects requested per page on list endpoints (PAM maximum is 1000)
+PAGE_SIZE = 1000
+
+# Timeout of network operations on PAM connections, in seconds
+REQUEST_TIMEOUT = 30
+
+# Number of bytes read at once from the socket when decoding a response incrementally
+READ_CHUNK_SIZE = 64 * 1024
+
+# Compressions of GET responses accepted from PAM, decoded incrementally (see DecodedResponse)
+ACCEPT_ENCODING = "gzip, deflate"
+
+
 # Concatenate url with GET parameters.
 # Eg: https://pvwa.tld/PasswordVault/api/Accounts?search=root%201.2.3.4%20sshkeys&filter=safeName%20eq%20SSH_Keys
 def req_get_build_url(url, params):
     out_url = url
     prefix_token = '?'
     for req_param in params:
+        if req_param == '':
+            continue
         out_url += prefix_token + req_param
         prefix_token = '&'
 
     return out_url
+
+
+# Build the headers of an authenticated request
+def req_build_headers(cyberark_session):
+    return {
+        "Content-Type": "application/json",
+        "Authorization": cyberark_session["token"],
+        "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
+    }
+
+
+# Session of a module: its cyberark_session, or the task's httpapi connection (cyberarkfrlab.pam.pvwa)
+# With the httpapi connection, urls are relative to PAM's base url and requests go through the connection.
+def req_module_session(module):
+    if module.params['cyberark_session'] is not None:
+        return module.params['cyberark_session']
+
+    if module._socket_path is None:
+        module.fail_json(success=False, msg="cyberark_session is required without the cyberarkfrlab.pam.pvwa "
+                                            "httpapi connection")
+
+    return dict(api_base_url='', socket_path=module._socket_path, validate_certs=True)
+
+
+# Send a request through the httpapi connection. Return dict(code, content) as text
+def req_send_connection(cyberark_session, method, url, data=None):
+    from ansible.module_utils.connection import Connection, ConnectionError
+
+    try:
+        return Connection(cyberark_session['socket_path']).send_request(method, url, data)
+    except ConnectionError as connection_exception:
+        return dict(code=None, content=to_text(connection_exception))
+
+
+# True when requests to url go through a proxy (*_proxy environment variables)
+def req_use_proxy(url):
+    from ansible.module_utils.six.moves.urllib.request import getproxies, proxy_bypass
+
+    parsed_url = urlparse(url)
+    return parsed_url.scheme in getproxies() and not proxy_bypass(parsed_url.hostname)
+
+
+# TLS context of the connections to PAM
+def req_ssl_context(cyberark_session):
+    import ssl
+
+    ssl_context = ssl.create_default_context()
+    if not cyberark_session["validate_certs"]:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+
+# Open a connection to the host of url
+def req_connect(cyberark_session, url, timeout=REQUEST_TIMEOUT):
+    parsed_url = urlparse(url)
+    if parsed_url.scheme != 'https':
+        return http_client.HTTPConnection(parsed_url.netloc, timeout=timeout)
+
+    return http_client.HTTPSConnection(parsed_url.netloc, timeout=timeout, context=req_ssl_context(cyberark_session))
+
+
+# Write a request on connection, its response is read with connection.getresponse()
+# headers are added to the default ones (see req_build_headers)
+def req_write(cyberark_session, connection, method, url, data=None, headers=None):
+    parsed_url = urlparse(url)
+    path = parsed_url.path + ('?' + parsed_url.query if parsed_url.query else '')
+    body = json.dumps(data) if data is not None else None
+
+    connection.request(method, path, body=body, headers=dict(req_build_headers(cyberark_session), **(headers or {})))
+
+
+# Send a request on a new connection with open_url (proxies, redirects and Ansible's TLS handling).
+# Return dict(code, response) with the unread response, code is None on network errors
+def req_open(cyberark_session, method, url, data=None, headers=None):
+    from ansible.module_utils.urls import open_url
+    from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+
+    kwargs = dict(
+        method=method,
+        headers=dict(req_build_headers(cyberark_session), **(headers or {})),
+        validate_certs=cyberark_session["validate_certs"],
+        data=json.dumps(data) if data is not None else None,
+        timeout=REQUEST_TIMEOUT,
+    )
+    try:
+        try:
+            # Compressed responses are decoded by DecodedResponse
+            response = open_url(url, decompress=False, **kwargs)
+        except TypeError:
+            # Ansible < 2.14 doesn't decompress responses, nor has the decompress option
+            response = open_url(url, **kwargs)
+    except HTTPError as http_exception:
+        return dict(code=http_exception.getcode(), response=http_exception)
+    except (URLError, HTTPException, OSError) as network_exception:
+        return dict(code=None, response=str(network_exception))
+
+    return dict(code=response.getcode(), response=response)
+
+
+# File-like reader of a response body compressed with encoding (Content-Encoding: gzip or deflate) or not (None),
+# decompressed incrementally as it is read.
+# compressed_bytes and uncompressed_bytes count the bytes received and the bytes decoded.
+class DecodedResponse:
+    def __init__(self, response, encoding=None):
+        self.response = response
+        self.encoding = (encoding or 'identity').strip().lower()
+        if self.encoding not in ('identity', 'gzip', 'x-gzip', 'deflate'):
+            raise ValueError("Unsupported response encoding: %s" % encoding)
+
+        self.decompressor = None
+        if self.encoding in ('gzip', 'x-gzip'):
+            self.decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif self.encoding == 'deflate':
+            self.decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        self.compressed_bytes = 0
+        self.uncompressed_bytes = 0
+        self.eof = False
+
+    # Read at most size decoded bytes, all the remaining ones when size is negative. b'' at the end of the body
+    def read(self, size=-1):
+        if size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        if self.decompressor is None:
+            chunk = self.response.read(size)
+            self.compressed_bytes += len(chunk)
+            self.uncompressed_bytes += len(chunk)
+            return chunk
+
+        while not self.eof:
+            data = self.decompressor.unconsumed_tail
+            if not data:
+                data = self.response.read(READ_CHUNK_SIZE)
+                self.compressed_bytes += len(data)
+                if not data:
+                    self.eof = True
+                    chunk = self.decompressor.flush()
+                    if not self.decompressor.eof:
+                        raise ValueError("Truncated %s response" % self.encoding)
+                    self.uncompressed_bytes += len(chunk)
+                    return chunk
+
+            chunk = self.decompress(data, size)
+            if chunk:
+                self.uncompressed_bytes += len(chunk)
+                return chunk
+
+        return b''
+
+    def decompress(self, data, size):
+        try:
+            return self.decompressor.decompress(data, size)
+        except zlib.error as decompress_exception:
+            # Some servers send deflate data without the zlib header
+            if self.encoding == 'deflate' and self.uncompressed_bytes == 0 and self.compressed_bytes == len(data):
+                self.encoding = 'raw deflate'
+                self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+                return self.decompress(data, size)
+            raise ValueError("Invalid %s response: %s" % (self.encoding, decompress_exception))
+
+
+# Send a GET request. The response is returned unread in content, as a DecodedResponse.
+# Compressed responses are accepted (see ACCEPT_ENCODING)
+def req_get(cyberark_session, url):
+    if 'socket_path' in cyberark_session:
+        response = req_send_connection(cyberark_session, "GET", url)
+        if response['code'] != 200:
+            return dict(success=False, code=response['code'], content=response['content'])
+        return dict(success=True, code=response['code'],
+                    content=DecodedResponse(io.BytesIO(to_bytes(response['content']))))
+
+    response = req_open(cyberark_session, "GET", url, headers={"Accept-Encoding": ACCEPT_ENCODING})
+    if response['code'] is None:
+        return dict(success=False, code=None, content=response['response'])
+
+    try:
+        content = DecodedResponse(response['response'], response['response'].headers.get('Content-Encoding'))
+        # Failed response
+        if response['code'] != 200:
+            return dict(success=False, code=response['code'], content=content.read())
+    except ValueError as decode_exception:
+        return dict(success=False, code=response['code'], content=str(decode_exception))
+
+    return dict(success=True, code=response['code'], content=content)
+
+
+# Send a request with an optional JSON body.
+# success is set when PAM answers with one of success_codes, the response body is returned in content
+def req_send(cyberark_session, method, url, data=None, success_codes=(200,), pool=None):
+    # Reuse a persistent connection
+    if pool is not None:
+        return pool.send(method, url, data, success_codes)
+
+    if 'socket_path' in cyberark_session:
+        response = req_send_connection(cyberark_session, method, url, data)
+        return dict(success=response['code'] in success_codes, code=response['code'], content=response['content'])
+
+    response = req_open(cyberark_session, method, url, data)
+    if response['code'] is None:
+        # Network errors have no HTTP status code
+        return dict(success=False, code=None, content=response['response'])
+
+    return dict(success=response['code'] in success_codes, code=response['code'],
+                content=response['response'].read())
+
+
+# Errors of a kept-alive connection closed by the server before it got a request: the request can be sent again
+STALE_CONNECTION_ERRORS = getattr(http_client, 'RemoteDisconnected', http_client.BadStatusLine)
+
+
+# Pool of persistent connections to PAM, shared by concurrent requests (see req_send)
+# Saves a TCP and TLS handshake per request. Requests go through req_send when a proxy or the httpapi connection
+# (which keeps its own pool) is used. Unlike req_open, redirects are not followed: PAM's API answers directly.
+class ConnectionPool:
+
+    def __init__(self, cyberark_session, timeout=REQUEST_TIMEOUT):
+        self.cyberark_session = cyberark_session
+        self.timeout = timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+        self.passthrough = ('socket_path' in cyberark_session or req_use_proxy(cyberark_session["api_base_url"]))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def send(self, method, url, data=None, success_codes=(200,)):
+        if self.passthrough:
+            return req_send(self.cyberark_session, method, url, data, success_codes)
+
+        with self.lock:
+            connection = self.idle.pop() if len(self.idle) > 0 else None
+        # An idle connection may have been closed by the server meanwhile: retry once with a new one.
+        # Only a request PAM did not get is sent again: writing it failed, or the connection was closed without a
+        # status line. After a timeout or a partial response, PAM may have processed it already.
+        for reused in ([True, False] if connection is not None else [False]):
+            if not reused:
+                connection = req_connect(self.cyberark_session, url, self.timeout)
+            try:
+                req_write(self.cyberark_session, connection, method, url, data,
+                          {"Accept-Encoding": ACCEPT_ENCODING} if method == "GET" else None)
+            except (HTTPException, OSError) as network_exception:
+                connection.close()
+                if reused:
+                    continue
+                return dict(success=False, code=None, content=str(network_exception))
+
+            try:
+                response = connection.getresponse()
+                content = response.read()
+            except STALE_CONNECTION_ERRORS as network_exception:
+                connection.close()
+                if reused:
+                    continue
+                return dict(success=False, code=None, content=str(network_exception))
+            except (HTTPException, OSError) as network_exception:
+                connection.close()
+                return dict(success=False, code=None, content=str(network_exception))
+
+            # The response is read: the connection can serve another request
+            if response.will_close:
+                connection.close()
+            else:
+                with self.lock:
+                    self.idle.append(connection)
+
+            if method == "GET":
+                try:
+                    content = DecodedResponse(io.BytesIO(content), response.getheader('Content-Encoding')).read()
+                except ValueError as decode_exception:
+                    return dict(success=False, code=response.status, content=str(decode_exception))
+
+            return dict(success=response.status in success_codes, code=response.status, content=content)
+
+    def close(self):
+        with self.lock:
+            for connection in self.idle:
+                connection.close()
+            self.idle = []
+
+
+# Content of the results of the requests not sent because of a cancellation
+CANCELLED = "Cancelled"
+
+
+# Send requests with threads sharing a ConnectionPool, at most parallelism requests in flight.
+# requests, cancel and stop_on_failure are those of async_send_all, the results are returned in the order of requests.
+# Requests are sent in order: their keys are ignored.
+def req_send_all(cyberark_session, requests, parallelism, timeout=REQUEST_TIMEOUT, cancel=None,
+                 stop_on_failure=False):
+    results = [None] * len(requests)
+    failed = []
+
+    with ConnectionPool(cyberark_session, timeout) as pool:
+        def send(index):
+            if len(failed) > 0 or (cancel is not None and cancel.is_set()):
+                results[index] = dict(success=False, code=None, content=CANCELLED)
+                return
+            request = requests[index]
+            results[index] = pool.send(request['method'], request['url'], request.get('data'),
+                                       request.get('success_codes', (200,)))
+            if stop_on_failure and not results[index]['success']:
+                failed.append(index)
+
+        bulk_run(send, range(len(requests)), parallelism)
+
+    return results
+
+
+# GET a JSON document, on a persistent connection of pool if set (see ConnectionPool)
+def req_get_json(cyberark_session, url, pool=None):
+    request = pool.send("GET", url) if pool is not None else req_get(cyberark_session, url)
+    if not request['success']:
+        return request
+
+    if pool is not None:
+        return dict(success=True, code=request['code'], content=json.loads(request['content']))
+
+    return dict(success=True, code=request['code'], content=json.loads(request['content'].read()))
+
+
+# Incremental decoder of a JSON object read from a file-like response.
+# Only the text of the value being decoded is kept in memory.
+class JsonStreamReader:
+    def __init__(self, response):
+        self.response = response
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    # Read the next chunk from the response, dropping already decoded text
+    def fill(self):
+        chunk = self.response.read(READ_CHUNK_SIZE)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.text_decoder.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    # Return the next non-whitespace character without consuming it, '' at the end of the response
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer) or self.eof:
+                return self.buffer[self.pos:self.pos + 1]
+            self.fill()
+
+    # Consume the next non-whitespace character, which must be one of expected
+    def expect(self, expected):
+        char = self.peek()
+        if char == '' or char not in expected:
+            raise ValueError("Expected one of '%s' at offset %d, got '%s'" % (expected, self.pos, char))
+        self.pos += 1
+        return char
+
+    # Decode the next JSON value, reading from the response until it is complete
+    def decode_value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # A value ending with the buffer may be truncated (Eg: numbers)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    # Decode a top-level object, yielding the elements of array_key one by one.
+    # The other keys of the object are stored in meta.
+    def iter_array(self, array_key, meta):
+        self.expect('{')
+        if self.peek() == '}':
+            return
+
+        while True:
+            key = self.decode_value()
+            self.expect(':')
+            if key == array_key and self.peek() == '[':
+                self.expect('[')
+                if self.peek() == ']':
+                    self.expect(']')
+                else:
+                    while True:
+                        yield self.decode_value()
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                meta[key] = self.decode_value()
+
+            if self.expect(',}') == '}':
+                return
+
+
+# Add the bytes received and decoded for a page (see req_get_pages) to transfer
+# transfer is dict(compressed_bytes, uncompressed_bytes)
+def req_add_transfer(transfer, page):
+    if 'transfer' in page:
+        for key in ('compressed_bytes', 'uncompressed_bytes'):
+            transfer[key] = transfer.get(key, 0) + page['transfer'][key]
+    return transfer
+
+
+# Iterate over the pages of a list endpoint (/Accounts, /Safes...), following nextLink.
+# Yield dict(success=True, content=[objects of the page], transfer=dict(compressed_bytes, uncompressed_bytes)) for
+# each page, the objects being mapped by mapper.
+# Objects are decoded one by one from the (decompressed) response and mapped as soon as they are read.
+# On failure, yield the failed request's result and stop.
+def req_get_pages(cyberark_session, url, mapper):
+    while url is not None:
+        request = req_get(cyberark_session, url)
+        if not request['success']:
+            yield request
+            return
+
+        # Top-level keys other than value (nextLink, count)
+        resp_meta = {}
+        try:
+            objects = list(mapper(JsonStreamReader(request['content']).iter_array('value', resp_meta)))
+            # Read the end of the body (eg. the gzip trailer) so that the bytes are fully counted
+            request['content'].read()
+        except ValueError as decode_exception:
+            yield dict(success=False, code=request['code'], content="Invalid JSON response: %s" % decode_exception)
+            return
+
+        yield dict(success=True, code=request['code'], content=objects,
+                   transfer=dict(compressed_bytes=request['content'].compressed_bytes,
+                                 uncompressed_bytes=request['content'].uncompressed_bytes))
+
+        # nextLink is relative to /PasswordVault/. Eg: api/Accounts?offset=1000&limit=1000
+        url = None
+        if 'nextLink' in resp_meta and resp_meta['nextLink']:
+            url = cyberark_session["api_base_url"] + "/PasswordVault/" + resp_meta['nextLink']
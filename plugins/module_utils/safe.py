@@ -1,19 +1,72 @@
 # Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 
-import json
-
-from ansible.module_utils.urls import open_url
 from ansible.module_utils.six.moves.urllib.parse import quote
 
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.generic import rename_keys, filter_objects_by
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_get_build_url
-
-from ansible.module_utils.six.moves.urllib.error import HTTPError
-from ansible.module_utils.six.moves.http_client import HTTPException
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.generic import (compile_key_mapper,
+                                                                                get_projection_fields)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import (req_add_transfer, req_get_build_url,
+                                                                                req_get_pages, req_send, PAGE_SIZE)
 
+import fnmatch
 import re
 
+# Characters PAM does not accept in safe names
+SAFE_NAME_INVALID_CHARS = re.compile('[/:*<>.|?"‰&+\\\\]')
+
+# Safe keys returned by PAM API renamed to the collection's keys
+SAFE_KEY_MAP = {
+    'safeUrlId': 'id',
+    'safeNumber': 'number',
+    'safeName': 'name',
+    'managingCPM': 'cpm',
+    'creationTime': 'created_time',
+    'lastModificationTime': 'modified_time',
+    'numberOfDaysRetention': 'retention_days',
+    'numberOfVersionsRetention': 'retention_versions',
+    'autoPurgeEnabled': 'auto_purge',
+    'olacEnabled': 'olac',
+}
+
+
+# Safe member keys returned by PAM API renamed to the collection's keys
+SAFE_MEMBER_KEY_MAP = {
+    'memberName': 'name',
+    'memberType': 'member_type',
+    'searchIn': 'search_in',
+    'membershipExpirationDate': 'membership_expiration_date',
+    'isPredefinedUser': 'predefined',
+}
+
+# Safe member permissions returned by PAM API renamed to the collection's keys
+SAFE_MEMBER_PERMISSION_KEY_MAP = {
+    'useAccounts': 'use_accounts',
+    'retrieveAccounts': 'retrieve_accounts',
+    'listAccounts': 'list_accounts',
+    'addAccounts': 'add_accounts',
+    'updateAccountContent': 'update_account_content',
+    'updateAccountProperties': 'update_account_properties',
+    'initiateCPMAccountManagementOperations': 'initiate_cpm_account_management_operations',
+    'specifyNextAccountContent': 'specify_next_account_content',
+    'renameAccounts': 'rename_accounts',
+    'deleteAccounts': 'delete_accounts',
+    'unlockAccounts': 'unlock_accounts',
+    'manageSafe': 'manage_safe',
+    'manageSafeMembers': 'manage_safe_members',
+    'backupSafe': 'backup_safe',
+    'viewAuditLog': 'view_audit_log',
+    'viewSafeMembers': 'view_safe_members',
+    'accessWithoutConfirmation': 'access_without_confirmation',
+    'createFolders': 'create_folders',
+    'deleteFolders': 'delete_folders',
+    'moveAccountsAndFolders': 'move_accounts_and_folders',
+    'requestsAuthorizationLevel1': 'requests_authorization_level1',
+    'requestsAuthorizationLevel2': 'requests_authorization_level2',
+}
+
+# Collection's safe member permissions renamed to PAM API keys
+API_SAFE_MEMBER_PERMISSION_KEY_MAP = dict((out_key, key) for key, out_key in SAFE_MEMBER_PERMISSION_KEY_MAP.items())
+
 
 # Build search parameter for GET /Accounts
 # Eg: search=root%201.2.3.4%20sshkeys
@@ -24,62 +77,128 @@ def req_safe_build_search_param(mod_parameters):
     return "search" + "=" + quote(mod_parameters["name"])
 
 
-# Search and return safes. Support search parameters
-def search_safes(module):
-    cyberark_session = module.params["cyberark_session"]
-
-    # Authentication header
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": cyberark_session["token"],
-        "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-    }
+# Search safes page by page. Support search parameters
+# Yield dict(success=True, content=[safes of the page]) per page, or the failed request's result
+def search_safes_pages(mod_parameters):
+    cyberark_session = mod_parameters["cyberark_session"]
 
     # Craft URL
     api_base_url = cyberark_session["api_base_url"]
-    validate_certs = cyberark_session["validate_certs"]
     endpoint = "/PasswordVault/api/Safes"
 
-    # Get all accounts that match safe, platform, user and address
-    url = req_get_build_url(api_base_url + endpoint, [req_safe_build_search_param(module.params)])
-
-    try:
-        response = open_url(
-            url,
-            method="GET",
-            headers=headers,
-            validate_certs=validate_certs,
-        )
-    except(HTTPError, HTTPException) as http_exception:
-        return dict(success=False, code=http_exception.getcode(), content=http_exception.read())
-
-    # Successful response
-    if response.getcode() != 200:
-        return dict(success=False, code=response.getcode(), content=response.read())
-
-    resp_data = json.loads(response.read())
-    safes = resp_data["value"] if 'value' in resp_data else []
-
-    # Filter found accounts by secret_type
-    # The API search mechanism doesn't support filtering by secret_type, this has to be done here.
-    safe_key_map = {
-        'safeUrlId': 'id',
-        'safeNumber': 'number',
-        'safeName': 'name',
-        'managingCPM': 'cpm',
-        'creationTime': 'created_time',
-        'lastModificationTime': 'modified_time',
-        'numberOfDaysRetention': 'retention_days',
-        'numberOfVersionsRetention': 'retention_versions',
-        'autoPurgeEnabled': 'auto_purge',
-        'olacEnabled': 'olac',
-    }
-    safes = rename_keys(safe_key_map, safes)
-
-    return dict(success=True, content=safes)
+    # Get all safes that match the name
+    url = req_get_build_url(api_base_url + endpoint,
+                            [req_safe_build_search_param(mod_parameters), "limit=" + str(PAGE_SIZE)])
 
+    return req_get_pages(cyberark_session, url,
+                         compile_key_mapper(SAFE_KEY_MAP, get_projection_fields(mod_parameters)))
 
-def verify_safe_name(name):
-    regex = re.compile('[/:*<>.|?"‰&+\\\\]')
 
-    return regex.search(name) is None
+# Search and return safes. Support search parameters
+# transfer counts the bytes received and decoded (see req_add_transfer)
+def search_safes(mod_parameters):
+    safes = []
+    transfer = dict(compressed_bytes=0, uncompressed_bytes=0)
+    for page in search_safes_pages(mod_parameters):
+        if not page['success']:
+            return page
+        safes.extend(page['content'])
+        req_add_transfer(transfer, page)
+
+    return dict(success=True, content=safes, transfer=transfer)
+
+
+# Return the names of the safes matching a shell-style pattern (eg. Linux_*_EU)
+def search_safe_names(cyberark_session, pattern):
+    # The literal part before the first wildcard narrows the search server side
+    prefix = re.split(r'[*?\[]', pattern, 1)[0]
+    search = search_safes(dict(cyberark_session=cyberark_session, name=prefix or None, fields=['name']))
+    if not search['success']:
+        return search
+
+    return dict(success=True, content=[safe['name'] for safe in search['content']
+                                       if fnmatch.fnmatchcase(safe['name'], pattern)])
+
+
+# Search the members of a safe, predefined users (eg. Master, Batch) are not returned
+def search_safe_members(cyberark_session, safe):
+    url = req_get_build_url(cyberark_session["api_base_url"] + "/PasswordVault/api/Safes/" + quote(safe) + "/Members",
+                            ["limit=" + str(PAGE_SIZE)])
+
+    rename_keys = compile_key_mapper(SAFE_MEMBER_KEY_MAP)
+    rename_permissions = compile_key_mapper(SAFE_MEMBER_PERMISSION_KEY_MAP)
+
+    def mapper(members):
+        for member in rename_keys(members):
+            member['permissions'] = next(rename_permissions([member.get('permissions') or {}]))
+            yield member
+
+    members = []
+    for page in req_get_pages(cyberark_session, url, mapper):
+        if not page['success']:
+            return page
+        members.extend(page['content'])
+
+    return dict(success=True, content=members)
+
+
+# Compare the current members of a safe to the desired ones (collection's keys)
+# Only the permissions set in desired members are compared. Members not desired are removed if purge.
+# Updated members get their current permissions overridden by the desired ones: PAM resets the missing ones.
+# Return the operations to apply: [(add|update|remove, member)]
+def safe_members_diff(current_members, desired_members, purge=False):
+    current_by_name = dict((member['name'].lower(), member) for member in current_members)
+    desired_names = set()
+
+    operations = []
+    for member in desired_members:
+        desired_names.add(member['name'].lower())
+        current = current_by_name.get(member['name'].lower())
+        if member['state'] == 'absent':
+            if current is not None:
+                operations.append(('remove', current))
+        elif current is None:
+            operations.append(('add', member))
+        elif any(current['permissions'].get(key, False) != value for key, value in member['permissions'].items()):
+            operations.append(('update', dict(member, name=current['name'],
+                                              permissions=dict(current['permissions'], **member['permissions']))))
+
+    if purge:
+        for name, current in current_by_name.items():
+            if name not in desired_names and not current.get('predefined'):
+                operations.append(('remove', current))
+
+    return operations
+
+
+# Convert a safe member (collection's keys) to the body expected by POST/PUT /Safes/{id}/Members
+def safe_member_to_api(member):
+    api_member = dict(
+        memberName=member['name'],
+        permissions=dict((API_SAFE_MEMBER_PERMISSION_KEY_MAP.get(key, key), value)
+                         for key, value in member['permissions'].items()),
+    )
+    if member.get('member_type') is not None:
+        api_member['memberType'] = member['member_type']
+    if member.get('search_in') is not None:
+        api_member['searchIn'] = member['search_in']
+
+    return api_member
+
+
+# Add, update or remove a member of a safe
+def apply_safe_member_operation(cyberark_session, safe, operation, member, pool=None):
+    url = cyberark_session["api_base_url"] + "/PasswordVault/api/Safes/" + quote(safe) + "/Members"
+
+    if operation == 'add':
+        return req_send(cyberark_session, "POST", url, safe_member_to_api(member), success_codes=(201,), pool=pool)
+    if operation == 'update':
+        permissions = safe_member_to_api(member)['permissions']
+        return req_send(cyberark_session, "PUT", url + "/" + quote(member['name']), dict(permissions=permissions),
+                        pool=pool)
+
+    return req_send(cyberark_session, "DELETE", url + "/" + quote(member['name']), success_codes=(204,), pool=pool)
+
+
+def verify_safe_name(name):
+    return SAFE_NAME_INVALID_CHARS.search(name) is None
@@ -0,0 +1,96 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+import json
+import os
+import tempfile
+
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import search_accounts_pages
+
+
+# Load the snapshot state file
+# Eg: {"safes": {"Linux_Passwords": {"high_water_mark": 1700000000, "accounts": {"25_21": {...}}}}}
+def load_sync_state(path):
+    if not os.path.exists(path):
+        return dict(safes={})
+
+    with open(path, 'r') as state_file:
+        return json.load(state_file)
+
+
+# Atomically write the snapshot state file
+def save_sync_state(path, state):
+    state_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=state_dir, prefix='.sync_state-')
+    try:
+        with os.fdopen(fd, 'w') as state_file:
+            json.dump(state, state_file)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+
+
+# Modification time of an account as filtered by PAM (modificationTime): the latest change of its properties
+# (categoryModificationTime) or of its secret (secretManagement.lastModifiedTime). None when unknown.
+def account_modification_time(account):
+    secret_management = account['secret_management'] if account.get('secret_management') else {}
+    times = [modified for modified in (account.get('modified_time'), secret_management.get('lastModifiedTime'))
+             if modified is not None]
+
+    return max(times) if len(times) > 0 else None
+
+
+# Compare the accounts of a safe with the known accounts (id -> account) of a previous sync.
+# Only accounts modified since high_water_mark are fetched, on the server side if server_filter is set.
+# The high-water mark tracks the modification time filtered by PAM (see account_modification_time).
+# Return dict(success=True, content=dict(added, changed, removed, high_water_mark)) or the failed request's result
+def sync_safe_accounts(cyberark_session, safe, known_accounts, high_water_mark, server_filter=True,
+                       detect_removed=True):
+    # The whole safe is listed on the first sync or when the server can't filter on modification time
+    full_listing = high_water_mark is None or not server_filter
+    search_params = dict(
+        cyberark_session=cyberark_session,
+        safe=safe,
+        identified_by='',
+        modified_since=None if full_listing else high_water_mark,
+    )
+
+    added = []
+    changed = []
+    seen_ids = set()
+    new_high_water_mark = high_water_mark
+    for page in search_accounts_pages(search_params):
+        if not page['success']:
+            return page
+
+        for account in page['content']:
+            seen_ids.add(account['id'])
+            modified_time = account_modification_time(account)
+            if modified_time is not None and (new_high_water_mark is None or modified_time > new_high_water_mark):
+                new_high_water_mark = modified_time
+
+            # Client side filtering when the whole safe is listed
+            if high_water_mark is not None and modified_time is not None and modified_time < high_water_mark:
+                continue
+
+            if account['id'] not in known_accounts:
+                added.append(account)
+            elif known_accounts[account['id']] != account:
+                changed.append(account)
+
+    removed = []
+    if detect_removed and len(known_accounts) > 0:
+        # Deleted accounts can't be returned by a modification time filter, list the ids of the safe
+        if not full_listing:
+            search_params.update(modified_since=None, ids_only=True)
+            for page in search_accounts_pages(search_params):
+                if not page['success']:
+                    return page
+                seen_ids.update(account['id'] for account in page['content'])
+
+        removed = [account for account_id, account in known_accounts.items() if account_id not in seen_ids]
+
+    return dict(success=True, content=dict(added=added, changed=changed, removed=removed,
+                                           high_water_mark=new_high_water_mark))
@@ -0,0 +1,361 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts, create_account,
+                                                                                account_build_patch, patch_account,
+                                                                                update_account_secret, delete_account,
+                                                                                ACCOUNT_KEY_MAP)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: account
+
+short_description: Create, update or delete an account.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Search for an account based on fields such as name, username, address, safe and platform, then converge it
+   to the desired state.
+   When the account exists, only the properties which differ from the desired state are sent to PAM with a
+   JSON-Patch request. Nothing is sent if the account is already up to date.
+   Changes if the account is created, updated or deleted.
+   Fails if more than one account is found or if there is an error.
+
+options:
+    state:
+        description:
+            - Set to C(present) to create or update the account.
+              Set to C(absent) to delete the account.
+        required: false
+        default: present
+        choices: [present, absent]
+        type: str
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    safe:
+        description: The safe in PAM where the privileged account is to be located.
+        required: true
+        type: str
+    identified_by:
+        description:
+            - This parameter is used to confidently identify a single account when the default query can return
+              multiple results.
+        required: false
+        default: username,address,platform_id
+        type: str
+    username:
+        description: Account's username.
+        required: false
+        type: str
+    address:
+        description: Account's address.
+        required: false
+        type: str
+    platform_id:
+        description: Id of the platform associated with the account. Required to create the account.
+        required: false
+        type: str
+    name:
+        description: ObjectID of the account. If used, identified_by fields are ignored.
+        required: false
+        type: str
+    secret:
+        description: Account's password or private key.
+        required: false
+        type: str
+    secret_type:
+        description: Account's secret type.
+        required: false
+        default: password
+        choices: [password, key]
+        type: str
+    update_secret:
+        description:
+            - C(on_create) only sets C(secret) when the account is created.
+              C(always) also sets C(secret) on existing accounts, which is always reported as a change.
+        required: false
+        default: on_create
+        choices: [on_create, always]
+        type: str
+    platform_account_properties:
+        description:
+            - Key-value pairs to associate with the account, as defined by the account platform.
+              Properties set to C(null) are removed. Other properties of the account are left untouched.
+        required: false
+        type: dict
+    automatic_management_enabled:
+        description: Whether the CPM manages the account's secret.
+        required: false
+        type: bool
+    manual_management_reason:
+        description: Reason for disabling automatic management of the account.
+        required: false
+        type: str
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Converge operator account"
+  cyberarkfrlab.pam.account:
+    identified_by: "address,username,platform_id"
+    username: "operator"
+    address: "0.0.0.0"
+    secret: "A strong password"
+    secret_type: "password"
+    safe: "Linux_Passwords"
+    platform_id: "UnixSSH"
+    platform_account_properties:
+      Port: "2222"
+    cyberark_session: "{{ cyberark_session }}"
+  no_log: true
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if the module run resulted in a change to the account in any way.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether the module successfully converged the account.
+    returned: always
+    type: bool
+response:
+    description: Response from PAM containing the error
+    returned: when not success
+    type: text
+account:
+    description: Account after the module run, as returned by M(cyberarkfrlab.pam.get_account).
+    returned: when C(state)==present and success and not check mode
+    type: dict
+patch:
+    description: JSON-Patch operations sent (or to be sent in check mode) to PAM.
+    returned: when the account already exists and C(state)==present
+    type: list
+    sample: [{"op": "replace", "path": "/platformAccountProperties/Port", "value": "2222"}]
+'''
+
+
+def run_module():
+    module_args = {
+        "state": {
+            "type": "str",
+            "choices": ["present", "absent"],
+            "default": "present",
+        },
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "safe": {
+            "required": True,
+            "type": "str"
+        },
+        "identified_by": {
+            "type": "str",
+            "default": "username,address,platform_id",
+        },
+        "username": {
+            "required": False,
+            "type": "str"
+        },
+        "address": {
+            "required": False,
+            "type": "str"
+        },
+        "platform_id": {
+            "required": False,
+            "type": "str"
+        },
+        "name": {
+            "required": False,
+            "type": "str"
+        },
+        "secret": {
+            "required": False,
+            "type": "str",
+            "no_log": True
+        },
+        "secret_type": {
+            "required": False,
+            "type": "str",
+            "choices": ["password", "key"],
+            "default": "password",
+        },
+        "update_secret": {
+            "type": "str",
+            "choices": ["on_create", "always"],
+            "default": "on_create",
+        },
+        "platform_account_properties": {
+            "required": False,
+            "type": "dict"
+        },
+        "automatic_management_enabled": {
+            "required": False,
+            "type": "bool"
+        },
+        "manual_management_reason": {
+            "required": False,
+            "type": "str"
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True,
+        required_if=[["update_secret", "always", ["secret"]]],
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    cyberark_session = module.params["cyberark_session"]
+
+    # Search for accounts with matching fields
+    search = search_accounts(module.params)
+    if not search['success']:
+        module.fail_json(success=False, msg="Search failed", response=search["content"])
+
+    accounts = search['content']
+    if len(accounts) > 1:
+        module.fail_json(success=False, msg='Found multiple accounts', response=accounts)
+
+    # Handle case: Account mustn't exist (state=absent)
+    if module.params['state'] == 'absent':
+        if len(accounts) == 0:
+            module.exit_json(changed=False, success=True)
+
+        if not module.check_mode:
+            deleted = delete_account(cyberark_session, accounts[0]['id'])
+            if not deleted['success']:
+                module.fail_json(success=False, msg='Account deletion failed', response=deleted['content'])
+            module.exit_json(changed=deleted['changed'], success=True)
+
+        module.exit_json(changed=True, success=True)
+
+    desired = dict(
+        safe=module.params['safe'],
+        name=module.params['name'],
+        username=module.params['username'],
+        address=module.params['address'],
+        platform_id=module.params['platform_id'],
+        secret_type=module.params['secret_type'],
+        platform_account_properties=module.params['platform_account_properties'],
+        secret_management=dict(
+            automatic_management_enabled=module.params['automatic_management_enabled'],
+            manual_management_reason=module.params['manual_management_reason'],
+        ),
+    )
+
+    # Handle case: Account doesn't exist yet
+    if len(accounts) == 0:
+        if module.params['platform_id'] is None:
+            module.fail_json(success=False, msg='platform_id is required to create an account')
+        if module.check_mode:
+            module.exit_json(changed=True, success=True)
+
+        desired['secret'] = module.params['secret']
+        created = create_account(cyberark_session, desired)
+        if not created['success']:
+            module.fail_json(success=False, msg='Account creation failed', response=created['content'])
+
+        module.exit_json(changed=created['changed'], success=True, account=created['content'])
+
+    # Handle case: Account exists, only send what differs
+    account = accounts[0]
+    operations = account_build_patch(account, desired)
+    update_secret = module.params['update_secret'] == 'always'
+    changed = len(operations) > 0 or update_secret
+    diff = dict(before=dict((operation['path'], account_get_path(account, operation['path']))
+                            for operation in operations),
+                after=dict((operation['path'], operation['value'] if 'value' in operation else None)
+                           for operation in operations))
+
+    if module.check_mode:
+        module.exit_json(changed=changed, success=True, account=account, patch=operations, diff=diff)
+
+    if len(operations) > 0:
+        patched = patch_account(cyberark_session, account['id'], operations)
+        if not patched['success']:
+            module.fail_json(success=False, msg='Account update failed', response=patched['content'],
+                             patch=operations)
+        account = patched['content']
+
+    if update_secret:
+        updated = update_account_secret(cyberark_session, account['id'], module.params['secret'])
+        if not updated['success']:
+            module.fail_json(success=False, msg='Secret update failed', response=updated['content'])
+
+    module.exit_json(changed=changed, success=True, account=account, patch=operations, diff=diff)
+
+
+# Return the value of an API path (Eg: /platformAccountProperties/Port) in an account (collection's keys)
+def account_get_path(account, path):
+    keys = path.strip('/').split('/')
+    value = account
+    for key in [ACCOUNT_KEY_MAP[keys[0]] if keys[0] in ACCOUNT_KEY_MAP else keys[0]] + keys[1:]:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+
+    return value
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts, get_account_by_id,
+                                                                                trigger_cpm_action, cpm_action_status)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import bulk_run
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import ConnectionPool, req_module_session
+
+import time
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: cpm_accounts
+
+short_description: Change, verify or reconcile the secrets of several accounts.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Find a list of accounts and ask the CPM to change, verify or reconcile their secrets, with concurrent requests.
+   Then wait for the CPM to process the actions, polling each account until its action is done.
+   Changes if at least one action is triggered.
+   Fails if an account cannot be found, if an action cannot be triggered, fails or times out, or if there is an error.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    action:
+        description: CPM action to trigger on each account.
+        required: true
+        choices: [change, verify, reconcile]
+        type: str
+    accounts:
+        description: Accounts to process. Either I(id) or I(safe) is required.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            id:
+                description: Internal ObjectID of the account.
+                required: false
+                type: str
+            safe:
+                description: The safe in PAM where the privileged account is to be located.
+                required: false
+                type: str
+            identified_by:
+                description: Fields used to identify a single account.
+                required: false
+                default: username,address,platform_id
+                type: str
+            username:
+                description: Account's username.
+                required: false
+                type: str
+            address:
+                description: Account's address.
+                required: false
+                type: str
+            platform_id:
+                description: Id of the platform associated with the account.
+                required: false
+                type: str
+            name:
+                description: Name of the account. If used, identified_by fields are ignored.
+                required: false
+                type: str
+            secret_type:
+                description: Account's secret type.
+                required: false
+                choices: [password, key]
+                type: str
+    wait:
+        description: Wait for the CPM to process the actions. Otherwise, return once the actions are triggered.
+        required: false
+        default: true
+        type: bool
+    parallelism:
+        description: Maximum number of concurrent requests to PAM.
+        required: false
+        default: 10
+        type: int
+    poll_interval:
+        description: Seconds between two polls of the accounts' status.
+        required: false
+        default: 10
+        type: int
+    timeout:
+        description: Maximum number of seconds to wait for the CPM.
+        required: false
+        default: 1800
+        type: int
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Change the root passwords of the hosts after an incident"
+  cyberarkfrlab.pam.cpm_accounts:
+    action: change
+    accounts:
+      - { safe: "Linux_Passwords", username: "root", address: "10.0.0.1", platform_id: "UnixSSH" }
+      - { safe: "Linux_Passwords", username: "root", address: "10.0.0.2", platform_id: "UnixSSH" }
+      - { id: "12_34" }
+    parallelism: 20
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Verify the root password of a host"
+  cyberarkfrlab.pam.cpm_accounts:
+    action: verify
+    accounts:
+      - { safe: "Linux_Passwords", username: "root", address: "10.0.0.1", platform_id: "UnixSSH" }
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one action was triggered.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether all the actions succeeded (or were triggered if not C(wait)).
+    returned: always
+    type: bool
+summary:
+    description: Number of accounts per status.
+    returned: always
+    type: dict
+    sample: {"succeeded": 198, "failed": 1, "timeout": 1}
+accounts:
+    description: One result per input account, in the same order.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        id:
+            description: Internal ObjectID of the account.
+            returned: when the account is found
+            type: str
+        safe:
+            description: The safe of the account.
+            returned: when the account is found
+            type: str
+        username:
+            description: The username of the account.
+            returned: when the account is found
+            type: str
+        address:
+            description: The address of the account.
+            returned: when the account is found
+            type: str
+        status:
+            description:
+                - C(not_found), C(trigger_failed), C(triggered) (if not C(wait)), C(succeeded), C(failed) or
+                  C(timeout).
+            type: str
+        duration:
+            description: Seconds between the trigger and the end of the action.
+            returned: when C(status) is C(succeeded) or C(failed)
+            type: float
+        secret_management:
+            description: Secret management status of the account once the action is done.
+            returned: when C(status) is C(succeeded) or C(failed)
+            type: dict
+        response:
+            description: Response from PAM containing the error.
+            returned: when C(status) is C(not_found) or C(trigger_failed)
+            type: text
+'''
+
+
+def run_module():
+    module_args = {
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "action": {
+            "required": True,
+            "type": "str",
+            "choices": ["change", "verify", "reconcile"],
+        },
+        "accounts": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "id": {"type": "str"},
+                "safe": {"type": "str"},
+                "identified_by": {"type": "str", "default": "username,address,platform_id"},
+                "username": {"type": "str"},
+                "address": {"type": "str"},
+                "platform_id": {"type": "str"},
+                "name": {"type": "str"},
+                "secret_type": {"type": "str", "choices": ["password", "key"]},
+            },
+            "required_one_of": [["id", "safe"]],
+        },
+        "wait": {
+            "type": "bool",
+            "default": True
+        },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
+        "poll_interval": {
+            "type": "int",
+            "default": 10
+        },
+        "timeout": {
+            "type": "int",
+            "default": 1800
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    cyberark_session = module.params["cyberark_session"]
+    action = module.params["action"]
+    parallelism = module.params["parallelism"]
+
+    # Find accounts and their secret management status before the action
+    resolved = bulk_run(lambda account: resolve_account(cyberark_session, account), module.params['accounts'],
+                        parallelism)
+    out_accounts = []
+    for account in resolved:
+        if not account['success']:
+            out_accounts.append(dict(status='not_found', response=account['content']))
+            continue
+        # Accounts may have no username or address
+        out_accounts.append(dict(id=account['content']['id'], safe=account['content'].get('safe'),
+                                 username=account['content'].get('username'),
+                                 address=account['content'].get('address'), status='pending'))
+
+    pending = [(out_account, account['content']) for out_account, account in zip(out_accounts, resolved)
+               if account['success']]
+    if module.check_mode:
+        module.exit_json(**build_result(out_accounts, changed=len(pending) > 0))
+
+    # Trigger CPM actions concurrently
+    with ConnectionPool(cyberark_session) as pool:
+        triggers = bulk_run(lambda item: trigger_cpm_action(cyberark_session, item[0]['id'], action, pool), pending,
+                            parallelism)
+    triggered_time = time.time()
+    for (out_account, account), trigger in zip(pending, triggers):
+        if trigger['success']:
+            out_account['status'] = 'triggered'
+        else:
+            out_account.update(status='trigger_failed', response=trigger['content'])
+    pending = [item for item in pending if item[0]['status'] == 'triggered']
+    changed = len(pending) > 0
+
+    # Poll the pending accounts only, by id, until every action is done
+    deadline = triggered_time + module.params['timeout']
+    while module.params['wait'] and len(pending) > 0:
+        if time.time() > deadline:
+            for out_account, account in pending:
+                out_account['status'] = 'timeout'
+            break
+        time.sleep(module.params['poll_interval'])
+
+        with ConnectionPool(cyberark_session) as pool:
+            polls = bulk_run(lambda item: get_account_by_id(cyberark_session, item[0]['id'], pool), pending,
+                             parallelism)
+
+        still_pending = []
+        for (out_account, account), poll in zip(pending, polls):
+            # Failed polls are retried until timeout
+            after = poll['content'].get('secret_management', {}) if poll['success'] else None
+            status = None
+            if after is not None:
+                status = cpm_action_status(action, account.get('secret_management', {}), after)
+            if status is None:
+                still_pending.append((out_account, account))
+                continue
+            out_account.update(status=status, secret_management=after,
+                               duration=round(time.time() - triggered_time, 3))
+        pending = still_pending
+
+        module.log("CPM %s: %d accounts pending" % (action, len(pending)))
+
+    result = build_result(out_accounts, changed)
+    if not result['success']:
+        result['msg'] = "CPM %s failed for %d accounts" % (action, len(out_accounts) - result['summary'].get(
+            'succeeded', 0) - result['summary'].get('triggered', 0))
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+# Find an account and its secret management status
+# Return dict(success, content=account) or the error
+def resolve_account(cyberark_session, account):
+    if account['id'] is not None:
+        return get_account_by_id(cyberark_session, account['id'])
+
+    search = search_accounts(dict(account, cyberark_session=cyberark_session,
+                                  fields=['safe', 'username', 'address', 'secret_management']))
+    if not search['success']:
+        return search
+    if len(search['content']) != 1:
+        return dict(success=False, content='Found %d accounts' % len(search['content']))
+
+    return dict(success=True, content=search['content'][0])
+
+
+# Build the module's result, with the number of accounts per status
+def build_result(out_accounts, changed):
+    summary = {}
+    for out_account in out_accounts:
+        summary[out_account['status']] = summary.get(out_account['status'], 0) + 1
+
+    success = all(out_account['status'] in ['pending', 'triggered', 'succeeded'] for out_account in out_accounts)
+    return dict(changed=changed, success=success, summary=summary, accounts=out_accounts)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (create_accounts,
+                                                                                bulk_create_accounts)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.journal import (load_journal, start_journal,
+                                                                                journal_checkpoint, remove_journal)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.progress import JobProgress
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: create_accounts
+
+short_description: Onboard accounts in bulk.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Onboard a list of accounts with PAM bulk upload jobs (BulkActions API) of at most C(batch_size) accounts, each
+   job submitted once the previous one finished. A failed job only fails the accounts of its batch.
+   When the bulk API isn't available, accounts are created concurrently, one request per account.
+   Changes if at least one account is created.
+   Fails if at least one account cannot be created or if there is an error.
+ - Supports C(async). While the accounts are created in C(parallel) mode in the background,
+   M(ansible.builtin.async_status) returns the C(progress) (C(done), C(total), C(failed), C(rate) per second and
+   C(elapsed) seconds), updated after each chunk of requests or each bulk upload job.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    accounts:
+        description: Accounts to onboard.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            safe:
+                description: The safe in PAM where the privileged account is to be located.
+                required: true
+                type: str
+            platform_id:
+                description: Id of the platform associated with the account.
+                required: true
+                type: str
+            username:
+                description: Account's username.
+                required: false
+                type: str
+            address:
+                description: Account's address.
+                required: false
+                type: str
+            name:
+                description: ObjectID of the account. Generated by PAM if not set.
+                required: false
+                type: str
+            secret:
+                description: Account's password or private key.
+                required: false
+                type: str
+            secret_type:
+                description: Account's secret type.
+                required: false
+                default: password
+                choices: [password, key]
+                type: str
+            platform_account_properties:
+                description: Key-value pairs to associate with the account, as defined by the account platform.
+                required: false
+                type: dict
+            automatic_management_enabled:
+                description: Whether the CPM manages the account's secret.
+                required: false
+                default: true
+                type: bool
+            manual_management_reason:
+                description: Reason for disabling automatic management of the account.
+                required: false
+                type: str
+    mode:
+        description:
+            - C(bulk) uses the bulk upload API, C(parallel) creates accounts one request per account.
+              C(auto) uses the bulk upload API and falls back to C(parallel) if it isn't available.
+        required: false
+        default: auto
+        choices: [auto, bulk, parallel]
+        type: str
+    parallelism:
+        description: Maximum number of concurrent requests in C(parallel) mode.
+        required: false
+        default: 10
+        type: int
+    safe_parallelism:
+        description:
+            - Maximum number of concurrent account creations in the same safe in C(parallel) mode.
+            - PAM serializes the writes in a safe, more concurrent requests only queue in PAM and may time out.
+              Creations are spread over the safes of the accounts.
+        required: false
+        default: 5
+        type: int
+    batch_size:
+        description: Maximum number of accounts of a bulk upload job.
+        required: false
+        default: 1000
+        type: int
+    journal_file:
+        description:
+            - Path of a local journal file (JSON lines) recording the accounts created, after each chunk of requests
+              or each bulk upload job, on the host running the module. Secrets are not written to the journal.
+            - When the creation of some accounts fails, the journal is kept. A new run with the same journal and
+              accounts only creates the accounts not created yet.
+            - The journal is removed once all the accounts are created.
+        required: false
+        type: path
+    poll_interval:
+        description: Seconds between two status requests of the bulk upload job.
+        required: false
+        default: 5
+        type: int
+    timeout:
+        description: Maximum number of seconds to wait for each bulk upload job.
+        required: false
+        default: 3600
+        type: int
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Onboard operator accounts of all hosts"
+  cyberarkfrlab.pam.create_accounts:
+    accounts: "{{ groups['all'] | map('extract', hostvars) | map('combine', {
+                    'username': 'operator', 'safe': 'Linux_Passwords', 'platform_id': 'UnixSSH'}) }}"
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one account was created.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether the module successfully created all the accounts.
+    returned: always
+    type: bool
+response:
+    description: Response from PAM containing the error
+    returned: when the bulk upload job cannot be submitted
+    type: text
+mode:
+    description: Mode used to create the accounts (C(bulk) or C(parallel)).
+    returned: always
+    type: str
+resumed:
+    description: Number of accounts created by a previous run, according to C(journal_file).
+    returned: when C(journal_file) is set
+    type: int
+accounts:
+    description: One result per input account, in the same order. Secrets are not returned.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        safe:
+            description: The safe of the account.
+            type: str
+        username:
+            description: The username of the account.
+            type: str
+        address:
+            description: The address of the account.
+            type: str
+        platform_id:
+            description: The id of the platform associated with the account.
+            type: str
+        success:
+            description: Whether the account was created (or already exists).
+            type: bool
+        changed:
+            description: Whether the account was created.
+            type: bool
+        id:
+            description: Internal ObjectID of the created account.
+            returned: when the account was created
+            type: str
+        response:
+            description: Response from PAM containing the error.
+            returned: when the account cannot be created
+            type: text
+'''
+
+
+# Keys identifying the accounts of a creation in its journal
+JOURNAL_ACCOUNT_KEYS = ['safe', 'platform_id', 'username', 'address', 'name', 'secret_type']
+
+
+def run_module():
+    module_args = {
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "accounts": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "safe": {"required": True, "type": "str"},
+                "platform_id": {"required": True, "type": "str"},
+                "username": {"type": "str"},
+                "address": {"type": "str"},
+                "name": {"type": "str"},
+                "secret": {"type": "str", "no_log": True},
+                "secret_type": {"type": "str", "choices": ["password", "key"], "default": "password"},
+                "platform_account_properties": {"type": "dict"},
+                "automatic_management_enabled": {"type": "bool", "default": True},
+                "manual_management_reason": {"type": "str"},
+            },
+        },
+        "mode": {
+            "type": "str",
+            "choices": ["auto", "bulk", "parallel"],
+            "default": "auto",
+        },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
+        "safe_parallelism": {
+            "type": "int",
+            "default": 5
+        },
+        "batch_size": {
+            "type": "int",
+            "default": 1000
+        },
+        "journal_file": {
+            "required": False,
+            "type": "path"
+        },
+        "poll_interval": {
+            "type": "int",
+            "default": 5
+        },
+        "timeout": {
+            "type": "int",
+            "default": 3600
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    cyberark_session = module.params["cyberark_session"]
+    accounts = [build_account(account) for account in module.params['accounts']]
+
+    results = [None] * len(accounts)
+    pending = list(range(len(accounts)))
+
+    # With a journal, accounts created by a previous run are skipped and creations are recorded
+    resumed = dict()
+    journal_file = module.params['journal_file']
+    if journal_file is not None:
+        identities = [dict((key, account[key]) for key in JOURNAL_ACCOUNT_KEYS) for account in accounts]
+        try:
+            journal = load_journal(journal_file, dict(module='create_accounts'))
+        except ValueError as journal_exception:
+            module.fail_json(success=False, changed=False, mode=module.params['mode'], msg="Invalid journal file",
+                             response=str(journal_exception))
+        if journal is not None and journal['items'] != identities:
+            module.fail_json(success=False, changed=False, mode=module.params['mode'], msg="Invalid journal file",
+                             response="Journal %s belongs to other accounts" % journal_file)
+
+        if journal is None:
+            start_journal(journal_file, dict(module='create_accounts'), identities)
+        else:
+            pending = [index for index in pending if index not in journal['done']]
+            for index in journal['done']:
+                results[index] = dict(success=True, changed=False, content="Created by a previous run")
+        resumed['resumed'] = len(accounts) - len(pending)
+
+    checkpoint = journal_checkpoint(journal_file, lambda index: pending[index])
+    progress = JobProgress()
+
+    mode = module.params['mode']
+    if mode in ['auto', 'bulk']:
+        created = bulk_create_accounts(cyberark_session, [accounts[index] for index in pending],
+                                       module.params['poll_interval'], module.params['timeout'],
+                                       module.params['batch_size'], checkpoint, progress.update)
+        if not created['success']:
+            # 404 Not Found or 405 Method Not Allowed - Bulk API isn't available
+            if mode == 'bulk' or created['code'] not in [404, 405]:
+                module.fail_json(success=False, changed=False, mode='bulk', msg="Bulk upload failed",
+                                 response=created['content'], **resumed)
+            mode = 'parallel'
+        else:
+            mode = 'bulk'
+            created = created['content']
+
+    if mode == 'parallel':
+        created = create_accounts(cyberark_session, [accounts[index] for index in pending],
+                                  module.params['parallelism'], module.params['safe_parallelism'], checkpoint,
+                                  progress.update)
+
+    for index, created_account in zip(pending, created):
+        results[index] = created_account
+
+    # Never return secrets
+    out_accounts = []
+    for account, created_account in zip(module.params['accounts'], results):
+        out_account = dict(safe=account['safe'], username=account['username'], address=account['address'],
+                           platform_id=account['platform_id'], success=created_account['success'],
+                           changed=created_account['changed'])
+        if created_account['success'] and created_account['changed']:
+            out_account['id'] = created_account['content']['id']
+        if not created_account['success']:
+            out_account['response'] = created_account['content']
+        out_accounts.append(out_account)
+
+    changed = any(account['changed'] for account in out_accounts)
+    if not all(account['success'] for account in out_accounts):
+        module.fail_json(success=False, changed=changed, mode=mode, msg="Failed to create accounts",
+                         accounts=out_accounts, **resumed)
+
+    if 'resumed' in resumed:
+        remove_journal(module.params['journal_file'])
+    result = dict(changed=changed, success=True, mode=mode, accounts=out_accounts, **resumed)
+    module.exit_json(**result)
+
+
+# Build account (collection's keys) from the module's account suboptions
+def build_account(account):
+    return dict(
+        safe=account['safe'],
+        platform_id=account['platform_id'],
+        username=account['username'],
+        address=account['address'],
+        name=account['name'],
+        secret=account['secret'],
+        secret_type=account['secret_type'],
+        platform_account_properties=account['platform_account_properties'],
+        secret_management=dict(
+            automatic_management_enabled=account['automatic_management_enabled'],
+            manual_management_reason=account['manual_management_reason'],
+        ),
+    )
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: create_key
+
+short_description: Generate an ssh key, upload it to PAM and authorize it on the host.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Check that the key account doesn't exist in PAM, generate an ssh key on the controller, upload the private key
+   to PAM and add the public key to the user's authorized_keys on the host, in a single task.
+   The private key is only kept in memory on the controller, it is never written to disk nor sent to the host.
+   PAM requests are sent from the controller, the host is only contacted to authorize the public key.
+   Changes if the key is created.
+   Ok if a key account already exists.
+   Fails if the key cannot be uploaded or authorized or if there is an error.
+ - This module is implemented as an action plugin and requires the C(cryptography) python library on the controller.
+ - In check mode, PAM is only searched, no key is generated nor uploaded.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+        required: true
+        type: dict
+    username:
+        description: User on the host. Created if it doesn't exist.
+        required: true
+        type: str
+    address:
+        description: Account's address.
+        required: false
+        default: Current host IPv4 address
+        type: str
+    safe:
+        description: The safe in PAM where the key is stored.
+        required: true
+        type: str
+    platform_id:
+        description: Id of the platform associated with the account.
+        required: true
+        type: str
+    key_type:
+        description: Type of the generated key. C(ed25519) keys are much faster to generate.
+        required: false
+        default: rsa
+        choices: [rsa, ed25519]
+        type: str
+    key_bits:
+        description: Size of C(rsa) keys.
+        required: false
+        default: 4096
+        type: int
+    comment:
+        description: Comment of the public key.
+        required: false
+        default: cyberark
+        type: str
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Generate, upload and authorize operator's ssh key"
+  cyberarkfrlab.pam.create_key:
+    username: "operator"
+    safe: "Linux_Keys"
+    platform_id: "UnixSSHKeys"
+    key_type: "ed25519"
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if the key was created.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether the key exists in PAM and is authorized on the host.
+    returned: always
+    type: bool
+response:
+    description: Response from PAM or from the host containing the error
+    returned: when not success
+    type: text
+account:
+    description: Account created or found in PAM, as returned by M(cyberarkfrlab.pam.get_account).
+    returned: when success, except in check mode when the key would be created
+    type: dict
+public_key:
+    description: Public key added to authorized_keys.
+    returned: when changed, except in check mode
+    type: str
+'''
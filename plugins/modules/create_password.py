@@ -0,0 +1,169 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: create_password
+
+short_description: Generate passwords, upload them to PAM and set them on the host.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - For all the given users of a host, in a single task, generate passwords on the controller, upload them to PAM
+   concurrently, then set them on the host in one remote step.
+   Passwords are only kept in memory on the controller, only their SHA-512 hashes are sent to the host.
+   Users which already have an account in PAM are left untouched.
+   Users which don't exist on the host are created.
+   Changes if at least one password is created.
+   Fails if a password cannot be uploaded or set or if there is an error.
+   When the passwords cannot be set on the host, their accounts are removed from PAM so that the task can be retried.
+ - In check mode, PAM is only searched, no password is generated nor uploaded.
+ - This module is implemented as an action plugin. It requires the C(passlib) python library on the controller.
+ - The passwords are set in one remote step with the C(useradd) and C(chpasswd) commands (Linux shadow-utils).
+   On hosts without them, the passwords are set with one M(ansible.builtin.user) call per user.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+        required: true
+        type: dict
+    users:
+        description: Users of the host.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            username:
+                description: User on the host.
+                required: true
+                type: str
+            password:
+                description: User's password. Randomly generated if not set or empty.
+                required: false
+                type: str
+            address:
+                description: Account's address. Overrides I(address) for this user.
+                required: false
+                type: str
+    address:
+        description: Accounts' address.
+        required: false
+        default: Current host IPv4 address
+        type: str
+    safe:
+        description: The safe in PAM where the passwords are stored.
+        required: true
+        type: str
+    platform_id:
+        description: Id of the platform associated with the accounts.
+        required: true
+        type: str
+    password_length:
+        description: Length of the generated passwords.
+        required: false
+        default: 24
+        type: int
+    parallelism:
+        description: Maximum number of concurrent requests to PAM.
+        required: false
+        default: 10
+        type: int
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Generate, upload and set passwords of local users"
+  cyberarkfrlab.pam.create_password:
+    users:
+      - username: "operator"
+      - username: "backup"
+      - username: "monitoring"
+    safe: "Linux_Passwords"
+    platform_id: "UnixSSH"
+    cyberark_session: "{{ cyberark_session }}"
+  become: true
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one password was created.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether all the passwords exist in PAM and are set on the host.
+    returned: always
+    type: bool
+response:
+    description: Response from the host containing the error
+    returned: when passwords cannot be set on the host
+    type: text
+retryable:
+    description:
+        - Whether running the task again can succeed. The passwords uploaded are either set on the host or their
+          accounts removed from PAM.
+    returned: when passwords cannot be uploaded or set on the host
+    type: bool
+users:
+    description: One result per user, in the same order. Passwords are not returned.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        username:
+            description: User on the host.
+            type: str
+        success:
+            description: Whether the password exists in PAM.
+            type: bool
+        changed:
+            description: Whether the password was created.
+            type: bool
+        id:
+            description: Internal ObjectID of the account.
+            returned: when success, except for the passwords to create in check mode
+            type: str
+        response:
+            description: Response from PAM containing the error.
+            returned: when not success
+            type: text
+'''
@@ -4,14 +4,8 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import (search_safes, verify_safe_name)
-
-from ansible.module_utils.six.moves.urllib.error import HTTPError
-from ansible.module_utils.six.moves.http_client import HTTPException
-
-from ansible.module_utils.urls import open_url
-
-import json
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import verify_safe_name
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session, req_send
 
 __metaclass__ = type
 
@@ -43,7 +37,8 @@ options:
         description:
             - Dictionary set by a CyberArk authentication containing the different values to perform actions on a 
               logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
-        required: true
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
         type: dict
     name:
         description: Name of the safe
@@ -222,7 +217,8 @@ safe:
 '''
 
 
-def run_module():
+# AnsibleModule arguments, shared with the action plugin running the module on the controller
+def module_spec():
     module_args = {
         "state": {
             "type": "str",
@@ -234,7 +230,7 @@ def run_module():
             "default": "true"
         },
         "cyberark_session": {
-            "required": True,
+            "required": False,
             "type": "dict",
             "no_log": True
         },
@@ -272,20 +268,21 @@ def run_module():
         }
     }
 
-    # the AnsibleModule object will be our abstraction working with Ansible
-    # this includes instantiation, a couple of common attr would be the
-    # args/params passed to the execution, as well as if the module
-    # supports check mode
-    module = AnsibleModule(
+    return dict(
         argument_spec=module_args,
         supports_check_mode=False,
     )
 
+
+# module is an AnsibleModule, or the action plugin's ModuleShim on the controller
+def run_module(module):
+    module.params['cyberark_session'] = req_module_session(module)
+
     if not verify_safe_name(module.params['name']):
         module.fail_json(success=False, msg="Invalid safe name", response=module.params['name'])
 
     # # Search for safes with matching fields
-    # search = search_safes(module)
+    # search = search_safes(module.params)
     # if not search['success']:
     #     module.fail_json(success=False, msg="Search failed", response=search["content"])
     #
@@ -308,16 +305,8 @@ def run_module():
 def create_safe(module):
     cyberark_session = module.params["cyberark_session"]
 
-    # Authentication header
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": cyberark_session["token"],
-        "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-    }
-
     # Craft URL
     api_base_url = cyberark_session["api_base_url"]
-    validate_certs = cyberark_session["validate_certs"]
     endpoint = "/PasswordVault/api/Safes"
 
     data = {
@@ -335,32 +324,24 @@ def create_safe(module):
     if 'retention_days' in module.params:
         data['numberOfDaysRetention'] = module.params['retention_days']
 
-    try:
-        response = open_url(
-            api_base_url + endpoint,
-            method="POST",
-            headers=headers,
-            validate_certs=validate_certs,
-            data=json.dumps(data),
-        )
-    except(HTTPError, HTTPException) as http_exception:
-        # 409 Conflict - Safe already exists
-        if http_exception.getcode() == 409:
-            return dict(changed=False, success=True, code=http_exception.getcode(), content=http_exception.read())
-
-        # Other 40X errors or network exceptions
-        return dict(changed=False, success=False, code=http_exception.getcode(), content=http_exception.read())
+    created = req_send(cyberark_session, "POST", api_base_url + endpoint, data, success_codes=(201,))
 
-    # New safe created
-    if response.getcode() == 201:
-        return dict(changed=True, success=True, code=response.getcode(), content=response.read())
+    # 409 Conflict - Safe already exists
+    if created['code'] == 409:
+        return dict(created, changed=False, success=True)
 
-    # Default case. Other errors
-    return dict(changed=False, success=False, code=response.getcode(), content=response.read())
+    # New safe created (201) or other errors
+    return dict(created, changed=created['success'])
 
 
 def main():
-    run_module()
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(**module_spec())
+
+    run_module(module)
 
 
 if __name__ == '__main__':
@@ -4,9 +4,13 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.urls import open_url
-
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import search_accounts
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts, delete_account,
+                                                                                delete_accounts)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import AdaptiveConcurrency
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.journal import (load_journal, start_journal,
+                                                                                journal_checkpoint, remove_journal)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.progress import JobProgress
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
 
 __metaclass__ = type
 
@@ -23,8 +27,12 @@ version_added: "1.0.0"
 description: 
  - Search and delete an account based on fields such as name, username, address, safe and platform.
    Changes if account is deleted.
-   Ok if account doesn't exist.
+   Ok if account doesn't exist or was deleted meanwhile.
+   Passwords and ssh keys are deleted through the Accounts API, with a fallback to the legacy API.
    Fails if account cannot be deleted or if there is an error.
+ - In check mode, the accounts which would be deleted are returned. Nothing is deleted nor written to C(journal_file).
+ - Supports C(async). While the deletions of C(multiple) run in the background, M(ansible.builtin.async_status)
+   returns their C(progress) (C(done), C(total), C(failed), C(rate) per second and C(elapsed) seconds).
 
 options:
     validate_certs:
@@ -39,7 +47,8 @@ options:
             - Dictionary set by a CyberArk authentication containing the different values to perform actions on a 
               logged-on CyberArk session, please see M(cyberark.pas.cyberark_authentication) module for an
               example of cyberark_session.
-        required: true
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
         type: dict
     safe:
         description: The safe in PAM where the privileged account is to be located.
@@ -77,6 +86,36 @@ options:
     multiple:
         description: Delete all accounts matching identified_by fields
         required: false 
+    parallelism:
+        description: Maximum number of concurrent account deletions when C(multiple).
+        required: false
+        default: 10
+        type: int
+    min_parallelism:
+        description:
+            - Minimum number of concurrent account deletions when C(multiple).
+            - When lower than C(parallelism), the concurrency starts at C(min_parallelism) and adapts to PAM's
+              latency and errors, up to C(parallelism).
+            - By default, the concurrency is fixed to C(parallelism).
+        required: false
+        type: int
+    safe_parallelism:
+        description:
+            - Maximum number of concurrent account deletions in the same safe when C(multiple).
+            - PAM serializes the writes in a safe, more concurrent requests only queue in PAM and may time out.
+              The concurrency of the deletions, all in C(safe), is the lowest of C(safe_parallelism) and
+              C(parallelism). By default, only C(parallelism) applies.
+        required: false
+        type: int
+    journal_file:
+        description:
+            - Path of a local journal file (JSON lines) recording the accounts deleted when C(multiple), on the host
+              running the module.
+            - When the deletion of some accounts fails, the journal is kept. A new run with the same journal and
+              search fields doesn't search the accounts again and only deletes the accounts not deleted yet.
+            - The journal is removed once all the accounts are deleted.
+        required: false
+        type: path
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
 # extends_documentation_fragment:
@@ -130,20 +169,41 @@ response:
     returned: when not success
     type: text
 accounts:
-    description: List of deleted accounts
+    description: List of deleted accounts, the accounts which would be deleted in check mode
     returned: when success
     type: json
+concurrency:
+    description:
+        - Concurrency reached (C(concurrency)) between C(min_parallelism) and C(parallelism), with the p95 latency of
+          PAM in seconds, the number of requests, of requests throttled by PAM (429, 503) and of reductions.
+    returned: when C(multiple) and accounts were found
+    type: dict
+    sample: {"concurrency": 24, "min_concurrency": 4, "max_concurrency": 50, "p95_latency": 0.412,
+             "requests": 2500, "throttled": 0, "decreases": 2}
+resumed:
+    description: Number of accounts already deleted by a previous run, according to C(journal_file).
+    returned: when C(multiple) and C(journal_file) is set
+    type: int
+failed_accounts:
+    description: Accounts that could not be deleted when C(multiple), with the code and response of PAM
+    returned: when C(multiple) and not success
+    type: list
 '''
 
 
-def run_module():
+# Parameters identifying a deletion of multiple accounts in its journal
+JOURNAL_OPERATION_KEYS = ['safe', 'identified_by', 'username', 'address', 'platform_id', 'name', 'secret_type']
+
+
+# AnsibleModule arguments, shared with the action plugin running the module on the controller
+def module_spec():
     module_args = {
         "validate_certs": {
             "type": "bool",
             "default": "true"
         },
         "cyberark_session": {
-            "required": True,
+            "required": False,
             "type": "dict",
             "no_log": True
         },
@@ -181,90 +241,116 @@ def run_module():
             "type": "bool",
             "default": "false"
         },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
+        "min_parallelism": {
+            "required": False,
+            "type": "int"
+        },
+        "safe_parallelism": {
+            "required": False,
+            "type": "int"
+        },
+        "journal_file": {
+            "required": False,
+            "type": "path"
+        },
     }
 
-    # the AnsibleModule object will be our abstraction working with Ansible
-    # this includes instantiation, a couple of common attr would be the
-    # args/params passed to the execution, as well as if the module
-    # supports check mode
-    module = AnsibleModule(
+    return dict(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
     )
 
-    search = search_accounts(module)
-    if not search['success']:
-        module.fail_json(success=False, msg="Search failed", response=search['content'])
 
-    accounts = search['content']
+# module is an AnsibleModule, or the action plugin's ModuleShim on the controller
+def run_module(module):
+    module.params['cyberark_session'] = req_module_session(module)
+
+    # Resume the deletions of a previous run from its journal, without searching the accounts again
+    journal_file = module.params['journal_file'] if module.params['multiple'] else None
+    journal = None
+    if journal_file is not None:
+        operation = dict((key, module.params[key]) for key in JOURNAL_OPERATION_KEYS)
+        try:
+            journal = load_journal(journal_file, dict(operation, module='delete_account'))
+        except ValueError as journal_exception:
+            module.fail_json(success=False, msg="Invalid journal file", response=str(journal_exception))
+
+    if journal is None:
+        search = search_accounts(module.params)
+        if not search['success']:
+            module.fail_json(success=False, msg="Search failed", response=search['content'])
+        accounts = search['content']
+    else:
+        accounts = journal['items']
+
     if len(accounts) == 0:
         result = dict(changed=False, success=True, accounts=accounts)
         module.exit_json(**result)
 
-    accounts_to_delete = []
-    if module.params["multiple"]:
-        accounts_to_delete = accounts
-    elif len(accounts) == 1:
-        accounts_to_delete.append(accounts[0])
-    else:
-        module.fail_json(success=False, msg='Multiple accounts found', response=search['content'])
-
-    # Start deletion
-    for account_to_delete in accounts_to_delete:
-        cyberark_session = module.params["cyberark_session"]
-        if account_to_delete['secret_type'] == 'key':
-            deleted = delete_key_account(cyberark_session, account_to_delete['id'])
-            if not deleted['success']:
-                module.fail_json(success=False, msg='Fail to delete key', response=deleted['content'])
-        elif account_to_delete['secret_type'] == 'password':
-            deleted = delete_password_account(cyberark_session, account_to_delete['id'])
-            if not deleted['success']:
-                module.fail_json(success=False, msg='Fail to delete password', response=deleted['content'])
-        else:
-            module.fail_json(success=False, msg='Account type not managed', response=account_to_delete)
-
-    result = dict(changed=True, success=True, accounts=accounts_to_delete)
-    module.exit_json(**result)
-
-
-def delete_password_account(cyberark_session, account_id):
-    # Craft URL
-    url = f"{cyberark_session['api_base_url']}/PasswordVault/api/Accounts/{account_id}"
-
-    # Delete account
-    response = open_url(
-        url,
-        method="DELETE",
-        headers={
-            "Authorization": cyberark_session["token"],
-            "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-        },
-        validate_certs=cyberark_session["validate_certs"],
-    )
+    # Check mode: return the accounts which would be deleted, without sending any DELETE nor writing the journal
+    if module.check_mode:
+        if journal is not None:
+            accounts = [account for account in accounts if account['id'] not in journal['done']]
+        if not module.params['multiple'] and len(accounts) > 1:
+            module.fail_json(success=False, msg='Multiple accounts found', response=accounts)
 
-    return dict(success=(response.getcode() == 204), code=response.getcode(), content=response.read())
+        result = dict(changed=len(accounts) > 0, success=True, accounts=accounts)
+        module.exit_json(**result)
 
+    # Delete all matching accounts concurrently
+    if module.params["multiple"]:
+        concurrency = AdaptiveConcurrency(module.params['min_parallelism'] or module.params['parallelism'],
+                                          module.params['parallelism'])
+        # With a journal, accounts deleted by a previous run are skipped and deletions are recorded
+        pending = accounts
+        resumed = dict()
+        if journal_file is not None:
+            if journal is None:
+                journal = dict(items=accounts, done=set())
+                start_journal(journal_file, dict(operation, module='delete_account'), accounts)
+            pending = [account for account in accounts if account['id'] not in journal['done']]
+            resumed['resumed'] = len(accounts) - len(pending)
+
+        purged = delete_accounts(module.params["cyberark_session"], pending, concurrency,
+                                 module.params['safe_parallelism'], JobProgress().update,
+                                 journal_checkpoint(journal_file, lambda account: account['id']))
+        # Accounts already deleted (404) are not changed
+        changed = purged['content']['deleted'] - purged['content']['missing'] > 0
+        if not purged['success']:
+            module.fail_json(success=False, changed=changed,
+                             msg='Failed to delete %d accounts' % len(purged['content']['failed']),
+                             failed_accounts=purged['content']['failed'], concurrency=concurrency.stats(), **resumed)
+
+        if journal_file is not None:
+            remove_journal(journal_file)
+        result = dict(changed=changed, success=True, accounts=accounts, concurrency=concurrency.stats(), **resumed)
+        module.exit_json(**result)
 
-def delete_key_account(cyberark_session, account_id):
-    # Craft URL
-    url = f"{cyberark_session['api_base_url']}/PasswordVault/WebServices/PIMServices.svc/Accounts/{account_id}"
+    if len(accounts) > 1:
+        module.fail_json(success=False, msg='Multiple accounts found', response=search['content'])
 
-    # Get all accounts that match safe, platform, user and address
-    response = open_url(
-        url,
-        method="DELETE",
-        headers={
-            "Authorization": cyberark_session["token"],
-            "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-        },
-        validate_certs=cyberark_session["validate_certs"],
-    )
+    # Start deletion, an account deleted meanwhile (404) is not changed
+    deleted = delete_account(module.params["cyberark_session"], accounts[0]['id'])
+    if not deleted['success']:
+        module.fail_json(success=False, msg='Fail to delete ' + accounts[0]['secret_type'],
+                         response=deleted['content'])
 
-    return dict(success=(response.getcode() == 200), code=response.getcode(), content=response.read())
+    result = dict(changed=deleted['changed'], success=True, accounts=accounts)
+    module.exit_json(**result)
 
 
 def main():
-    run_module()
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(**module_spec())
+
+    run_module(module)
 
 
 if __name__ == '__main__':
@@ -5,13 +5,16 @@
 from __future__ import (absolute_import, division, print_function)
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import (search_safes, verify_safe_name)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import search_accounts, delete_accounts
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import AdaptiveConcurrency
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.journal import (load_journal, start_journal,
+                                                                                journal_checkpoint, remove_journal)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.progress import JobProgress
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session, req_send
 
-from ansible.module_utils.six.moves.urllib.error import HTTPError
-from ansible.module_utils.six.moves.http_client import HTTPException
+from ansible.module_utils.six.moves.urllib.parse import quote
 
-from ansible.module_utils.urls import open_url
-
-import json
+import time
 
 __metaclass__ = type
 
@@ -27,9 +30,12 @@ version_added: "1.0.0"
 
 description: 
  - Search and delete a safe based on the name.
+   With C(purge), the safe's accounts are deleted concurrently before the safe.
    Changes if safe is deleted.
    Ok if safe is already exists.
    Fails if safe cannot be delete or if there is an error.
+ - Supports C(async). While a purge runs in the background, M(ansible.builtin.async_status) returns its
+   C(progress) (C(done), C(total), C(failed), C(rate) per second and C(elapsed) seconds).
 
 options:
     state:
@@ -51,12 +57,51 @@ options:
         description:
             - Dictionary set by a CyberArk authentication containing the different values to perform actions on a 
               logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
-        required: true
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
         type: dict
     name:
         description: Name of the safe
         required: true
         type: str
+    purge:
+        description:
+            - Delete all the accounts of the safe before deleting it. PAM refuses to delete a safe which contains
+              accounts.
+            - The safe is not deleted if an account cannot be deleted.
+        required: false
+        default: false
+        type: bool
+    parallelism:
+        description: Maximum number of concurrent account deletions when C(purge).
+        required: false
+        default: 10
+        type: int
+    min_parallelism:
+        description:
+            - Minimum number of concurrent account deletions when C(purge).
+            - When lower than C(parallelism), the concurrency starts at C(min_parallelism) and adapts to PAM's
+              latency and errors, up to C(parallelism).
+            - By default, the concurrency is fixed to C(parallelism).
+        required: false
+        type: int
+    safe_parallelism:
+        description:
+            - Maximum number of concurrent account deletions in the same safe when C(purge).
+            - PAM serializes the writes in a safe, more concurrent requests only queue in PAM and may time out.
+              The concurrency of a purge, all in one safe, is the lowest of C(safe_parallelism) and C(parallelism).
+              By default, only C(parallelism) applies.
+        required: false
+        type: int
+    journal_file:
+        description:
+            - Path of a local journal file (JSON lines) recording the accounts deleted when C(purge), on the host
+              running the module.
+            - When the deletion of some accounts fails, the journal is kept. A new run with the same journal doesn't
+              list the accounts of the safe again and only deletes the accounts not deleted yet.
+            - The journal is removed once all the accounts are deleted.
+        required: false
+        type: path
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
 # extends_documentation_fragment:
@@ -81,6 +126,23 @@ EXAMPLES = r'''
     name: "Linux_Accounts"
     cyberark_session: "{{ cyberark_session }}"
 
+- name: "Purge and delete a safe in the background"
+  cyberarkfrlab.pam.delete_safe:
+    name: "Linux_Accounts"
+    purge: true
+    cyberark_session: "{{ cyberark_session }}"
+  async: 3600
+  poll: 0
+  register: purge_job
+
+- name: "Wait for the purge, its progress is displayed with -v"
+  ansible.builtin.async_status:
+    jid: "{{ purge_job.ansible_job_id }}"
+  register: purge_status
+  until: purge_status.finished
+  retries: 360
+  delay: 10
+
 - name: "Logout from PAM Web portal"
   ansible.builtin.include_role:
     name: cyberarkfrlab.pam.logout
@@ -103,6 +165,46 @@ response:
     description: Response from PAM containing the error
     returned: when not C(success)
     type: text
+purge:
+    description: Accounts deleted before the safe
+    returned: when C(purge) and the safe exists
+    type: complex
+    contains:
+        found:
+            description: Number of accounts in the safe.
+            type: int
+            sample: 250
+        deleted:
+            description: Number of accounts deleted (or already deleted).
+            type: int
+            sample: 248
+        missing:
+            description: Number of accounts already deleted (not found by PAM), included in C(deleted).
+            type: int
+            sample: 0
+        failed:
+            description: Accounts which could not be deleted, with the error returned by PAM.
+            type: list
+            elements: dict
+            sample: [{"id": "12_34", "code": 403, "response": "..."}]
+        resumed:
+            description: Number of accounts deleted by a previous run, according to C(journal_file).
+            returned: when C(journal_file) is set
+            type: int
+            sample: 7342
+concurrency:
+    description:
+        - Concurrency reached (C(concurrency)) between C(min_parallelism) and C(parallelism), with the p95 latency of
+          PAM in seconds, the number of requests, of requests throttled by PAM (429, 503) and of reductions.
+    returned: when C(purge) and the safe exists
+    type: dict
+    sample: {"concurrency": 24, "min_concurrency": 4, "max_concurrency": 50, "p95_latency": 0.412,
+             "requests": 2500, "throttled": 0, "decreases": 2}
+timings:
+    description: Duration of each step in seconds
+    returned: when C(purge) and the safe exists
+    type: dict
+    sample: {"purge": 12.345, "delete": 0.321}
 safes:
     description: List of safes found
     returned: when C(state)==present and C(multiple) and C(success)
@@ -192,7 +294,8 @@ safe:
 '''
 
 
-def run_module():
+# AnsibleModule arguments, shared with the action plugin running the module on the controller
+def module_spec():
     module_args = {
         "state": {
             "type": "str",
@@ -204,7 +307,7 @@ def run_module():
             "default": "true"
         },
         "cyberark_session": {
-            "required": True,
+            "required": False,
             "type": "dict",
             "no_log": True
         },
@@ -212,22 +315,43 @@ def run_module():
             "required": True,
             "type": "str"
         },
+        "purge": {
+            "type": "bool",
+            "default": False
+        },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
+        "min_parallelism": {
+            "required": False,
+            "type": "int"
+        },
+        "safe_parallelism": {
+            "required": False,
+            "type": "int"
+        },
+        "journal_file": {
+            "required": False,
+            "type": "path"
+        },
     }
 
-    # the AnsibleModule object will be our abstraction working with Ansible
-    # this includes instantiation, a couple of common attr would be the
-    # args/params passed to the execution, as well as if the module
-    # supports check mode
-    module = AnsibleModule(
+    return dict(
         argument_spec=module_args,
         supports_check_mode=False,
     )
 
+
+# module is an AnsibleModule, or the action plugin's ModuleShim on the controller
+def run_module(module):
+    module.params['cyberark_session'] = req_module_session(module)
+
     if not verify_safe_name(module.params['name']):
         module.fail_json(success=False, msg="Invalid safe name")
 
     # Search for safes with matching fields
-    search = search_safes(module)
+    search = search_safes(module.params)
     if not search['success']:
         module.fail_json(success=False, msg="Search failed", response=search['content'])
 
@@ -246,46 +370,94 @@ def run_module():
         result = dict(changed=False, success=True)
         module.exit_json(**result)
 
+    result = dict(changed=False, success=True)
+
+    # Delete safe's accounts first
+    if module.params['purge']:
+        result['timings'] = dict()
+        started = time.time()
+
+        # Resume the purge of a previous run from its journal, without listing the accounts again
+        journal_file = module.params['journal_file']
+        journal = None
+        operation = dict(module='delete_safe', safe=matching_safe['name'])
+        if journal_file is not None:
+            try:
+                journal = load_journal(journal_file, operation)
+            except ValueError as journal_exception:
+                module.fail_json(success=False, msg="Invalid journal file", response=str(journal_exception))
+
+        if journal is None:
+            # All accounts are listed before deleting, deletions would shift the pages' offsets
+            search = search_accounts(dict(cyberark_session=module.params['cyberark_session'],
+                                          safe=matching_safe['name'], identified_by='', ids_only=True))
+            if not search['success']:
+                module.fail_json(success=False, msg="Accounts search failed", response=search['content'])
+
+            journal = dict(items=[dict(id=account['id'], safe=matching_safe['name'])
+                                  for account in search['content']], done=set())
+            if journal_file is not None:
+                start_journal(journal_file, operation, journal['items'])
+
+        accounts = [account for account in journal['items'] if account['id'] not in journal['done']]
+        concurrency = AdaptiveConcurrency(module.params['min_parallelism'] or module.params['parallelism'],
+                                          module.params['parallelism'])
+        job = JobProgress()
+        purged = delete_accounts(module.params['cyberark_session'], accounts, concurrency,
+                                 module.params['safe_parallelism'],
+                                 lambda done, total, failed: purge_progress(module, job, matching_safe['id'], done,
+                                                                            total, failed),
+                                 journal_checkpoint(journal_file, lambda account: account['id']))
+        if journal_file is not None:
+            purged['content'].update(found=len(journal['items']), resumed=len(journal['done']))
+        result['timings']['purge'] = round(time.time() - started, 3)
+        result['concurrency'] = concurrency.stats()
+        result['purge'] = purged['content']
+        result['changed'] = purged['content']['deleted'] - purged['content']['missing'] > 0
+        if not purged['success']:
+            result.update(success=False, msg="Failed to delete %d accounts" % len(purged['content']['failed']))
+            module.fail_json(**result)
+
+        if journal_file is not None:
+            remove_journal(journal_file)
+
     # Start safe deletion
+    started = time.time()
     deleted = delete_safe(module, matching_safe)
+    if 'timings' in result:
+        result['timings']['delete'] = round(time.time() - started, 3)
     if not deleted['success']:
-        module.fail_json(success=False, msg="Safe deletion failed", response=deleted["content"])
+        result.update(success=False, msg="Safe deletion failed", response=deleted["content"])
+        module.fail_json(**result)
 
-    # Found no safe with the same exact name found
-    result = dict(changed=True, success=True)
+    result['changed'] = True
     module.exit_json(**result)
 
 
 def delete_safe(module, safe):
     cyberark_session = module.params["cyberark_session"]
 
-    # Authentication header
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": cyberark_session["token"],
-        "User-Agent": "CyberArk/1.0 (Ansible; cyberarkfrlab.pam)"
-    }
-
     # Craft URL
     api_base_url = cyberark_session["api_base_url"]
-    validate_certs = cyberark_session["validate_certs"]
-    endpoint = f"/PasswordVault/api/Safes/{safe['id']}"
+    endpoint = "/PasswordVault/api/Safes/" + quote(safe['id'])
+
+    return req_send(cyberark_session, "DELETE", api_base_url + endpoint, success_codes=(204,))
 
-    try:
-        response = open_url(
-            api_base_url + endpoint,
-            method="DELETE",
-            headers=headers,
-            validate_certs=validate_certs,
-        )
-    except(HTTPError, HTTPException) as http_exception:
-        return dict(success=False, code=http_exception.getcode(), content=http_exception.read())
 
-    return dict(success=(response.getcode() == 204), code=response.getcode(), content=response.read())
+# Log the progress of a purge and report it to async_status when the module runs with async
+def purge_progress(module, job, safe, done, total, failed):
+    module.log("Purged %d/%d accounts of safe %s (%d failed)" % (done, total, safe, failed))
+    job.update(done, total, failed)
 
 
 def main():
-    run_module()
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(**module_spec())
+
+    run_module(module)
 
 
 if __name__ == '__main__':
@@ -4,7 +4,14 @@
 # GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
 from __future__ import (absolute_import, division, print_function)
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import search_accounts
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.account import (search_accounts, search_accounts_pages,
+                                                                                search_accounts_in_safes,
+                                                                                search_accounts_in_safes_pages)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.output import write_pages_jsonl_gzip
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import search_safe_names
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+import time
 
 __metaclass__ = type
 
@@ -44,12 +51,31 @@ options:
         description:
             - Dictionary set by a CyberArk authentication containing the different values to perform actions on a 
               logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
-        required: true
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
         type: dict
     safe:
         description: The safe in PAM where the privileged account is to be located.
-        required: true
+        required: false
         type: str
+    safes:
+        description:
+            - List of safes where the privileged account is to be located. Safes are searched concurrently and the
+              accounts found are merged.
+        required: false
+        type: list
+        elements: str
+    safe_pattern:
+        description:
+            - Shell-style pattern of the safes where the privileged account is to be located (eg. C(Linux_*_EU)).
+              Matching safes are searched concurrently and the accounts found are merged.
+        required: false
+        type: str
+    parallelism:
+        description: Maximum number of concurrent searches when C(safes) or C(safe_pattern) is used.
+        required: false
+        default: 10
+        type: int
     identified_by:
         description:
             - This parameter is used to confidently identify a single account when the default query can return
@@ -79,6 +105,42 @@ options:
         default: password
         choices: [password, key]
         type: str
+    multiple:
+        description: Return all accounts matching identified_by fields
+        required: false
+        default: false
+        type: bool
+    fields:
+        description:
+            - List of account fields to return (eg. C(username), C(address), C(platform_id)).
+              C(id) is always returned. Other fields are never copied from PAM's response.
+        required: false
+        type: list
+        elements: str
+    ids_only:
+        description: Only return the ids of the accounts found in C(ids).
+        required: false
+        default: false
+        type: bool
+    count_only:
+        description:
+            - Only return the number of accounts found in C(count).
+              Fails only if C(state) is C(absent) and accounts are found.
+        required: false
+        default: false
+        type: bool
+    output_file:
+        description:
+            - Write all the accounts found to this file instead of returning them, as gzip compressed JSON lines
+              (one account per line). Only C(count) and C(output_file) are returned.
+            - Accounts are written page by page as they are fetched, the memory used doesn't depend on the number of
+              accounts. Safes of C(safes) or C(safe_pattern) are searched one after the other.
+            - The file is on the host running the module, the controller with the C(local) connection or the
+              C(cyberarkfrlab.pam.pvwa) httpapi connection. It is replaced once all the accounts are written and is
+              not written in check mode.
+            - Doesn't fail when no account is found. Ignored when C(state) is C(absent).
+        required: false
+        type: path
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
 # extends_documentation_fragment:
@@ -110,6 +172,22 @@ EXAMPLES = r'''
   retries: 5
   delay: 10
 
+- name: "Find root accounts of a host in all the regional safes"
+  cyberarkfrlab.pam.get_account:
+    identified_by: "address,username"
+    username: "root"
+    address: "0.0.0.0"
+    safe_pattern: "Linux_*_Passwords"
+    multiple: true
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Export all the accounts of the Linux safes"
+  cyberarkfrlab.pam.get_account:
+    identified_by: ""
+    safe_pattern: "Linux_*"
+    output_file: "/var/tmp/linux_accounts.jsonl.gz"
+    cyberark_session: "{{ cyberark_session }}"
+
 - name: "Logout from PAM Web portal"
   ansible.builtin.include_role:
     name: cyberarkfrlab.pam.logout
@@ -132,6 +210,25 @@ response:
     description: Response from PAM containing the error
     returned: when not success
     type: text
+count:
+    description: Number of accounts found
+    returned: when state==present and count_only or output_file and success
+    type: int
+output_file:
+    description: File the accounts found were written to
+    returned: when state==present and output_file and success
+    type: str
+timings:
+    description:
+        - Duration of the search in seconds, with the bytes received from PAM (C(compressed_bytes)) and decoded
+          (C(uncompressed_bytes)). Responses are compressed when PAM supports it (gzip or deflate).
+    returned: when state==present and success
+    type: dict
+    sample: {"search": 4.321, "compressed_bytes": 1250000, "uncompressed_bytes": 8400000}
+ids:
+    description: List of the ids of the accounts found
+    returned: when state==present and ids_only and success
+    type: list
 accounts:
     description: List of accounts found
     returned: when state==present and multiple and success
@@ -227,26 +324,40 @@ account:
 '''
 
 
-def run_module():
+# AnsibleModule arguments, shared with the action plugin running the module on the controller
+def module_spec():
     module_args = {
         "state": {
-           "type": "str",
-           "choices": ["present", "absent"],
-           "default": "present",
+            "type": "str",
+            "choices": ["present", "absent"],
+            "default": "present",
         },
         "validate_certs": {
             "type": "bool",
             "default": "true"
         },
         "cyberark_session": {
-            "required": True,
+            "required": False,
             "type": "dict",
             "no_log": True
         },
         "safe": {
-            "required": True,
+            "required": False,
+            "type": "str"
+        },
+        "safes": {
+            "required": False,
+            "type": "list",
+            "elements": "str"
+        },
+        "safe_pattern": {
+            "required": False,
             "type": "str"
         },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
         "identified_by": {
             "type": "str",
             "default": "username,address,platform_id",
@@ -277,21 +388,73 @@ def run_module():
             "type": "bool",
             "default": "false"
         },
+        "fields": {
+            "required": False,
+            "type": "list",
+            "elements": "str"
+        },
+        "ids_only": {
+            "type": "bool",
+            "default": False
+        },
+        "count_only": {
+            "type": "bool",
+            "default": False
+        },
+        "output_file": {
+            "required": False,
+            "type": "path"
+        },
     }
 
-    # the AnsibleModule object will be our abstraction working with Ansible
-    # this includes instantiation, a couple of common attr would be the
-    # args/params passed to the execution, as well as if the module
-    # supports check mode
-    module = AnsibleModule(
+    return dict(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
+        mutually_exclusive=[["fields", "ids_only", "count_only"], ["ids_only", "count_only", "output_file"],
+                            ["safe", "safes", "safe_pattern"]],
+        required_one_of=[["safe", "safes", "safe_pattern"]],
     )
 
-    # Search for accounts with matching fields
-    search = search_accounts(module)
+
+# module is an AnsibleModule, or the action plugin's ModuleShim on the controller
+def run_module(module):
+    module.params['cyberark_session'] = req_module_session(module)
+
+    # Search for accounts with matching fields, in one or several safes
+    safes = module.params['safes']
+    if module.params['safe_pattern'] is not None:
+        safes_search = search_safe_names(module.params['cyberark_session'], module.params['safe_pattern'])
+        if not safes_search['success']:
+            module.fail_json(success=False, msg="Safes search failed", response=safes_search["content"])
+        safes = safes_search['content']
+
+    # Handle case: Write accounts to a file, page by page
+    if module.params['output_file'] is not None and module.params['state'] == 'present':
+        started = time.time()
+        if safes is not None:
+            pages = search_accounts_in_safes_pages(module.params, safes)
+        else:
+            pages = search_accounts_pages(module.params)
+        try:
+            written = write_pages_jsonl_gzip(module.params['output_file'], pages, module.check_mode)
+        except (IOError, OSError) as write_exception:
+            module.fail_json(success=False, msg="Failed to write output_file", response=str(write_exception))
+        if not written['success']:
+            module.fail_json(success=False, msg="Search failed", response=written["content"])
+
+        timings = dict(search=round(time.time() - started, 3), **written['transfer'])
+        result = dict(changed=False, success=True, count=written['content'], output_file=module.params['output_file'],
+                      timings=timings)
+        module.exit_json(**result)
+
+    started = time.time()
+    if safes is not None:
+        search = search_accounts_in_safes(module.params, safes, module.params['parallelism'])
+    else:
+        search = search_accounts(module.params)
     if not search['success']:
         module.fail_json(success=False, msg="Search failed", response=search["content"])
+    timings = dict(search=round(time.time() - started, 3), **search['transfer'])
 
     accounts = search['content']
     # Handle case: Account mustn't exist (state=absent)
@@ -302,25 +465,41 @@ def run_module():
             result = dict(changed=False, success=True)
             module.exit_json(**result)
 
+    # Handle case: Only count accounts
+    if module.params['count_only']:
+        result = dict(changed=False, success=True, count=len(accounts), timings=timings)
+        module.exit_json(**result)
+
     # Handle case: One account must exist (state=present)
     if len(accounts) == 0:
         module.fail_json(success=False, msg='No account found', response=accounts)
 
-    if module.params['multiple']:
-        result = dict(changed=False, success=True, accounts=accounts)
+    if not module.params['multiple'] and len(accounts) > 1:
+        # We must have exactly one account
+        module.fail_json(success=False, msg='Found multiple accounts', response=search['content'])
+
+    if module.params['ids_only']:
+        result = dict(changed=False, success=True, ids=[account['id'] for account in accounts],
+                      timings=timings)
         module.exit_json(**result)
 
-    # We must have exactly one account
-    if len(accounts) > 1:
-        module.fail_json(success=False, msg='Found multiple accounts', response=search['content'])
+    if module.params['multiple']:
+        result = dict(changed=False, success=True, accounts=accounts, timings=timings)
+        module.exit_json(**result)
 
     # Return account
-    result = dict(changed=False, success=True, account=accounts[0])
+    result = dict(changed=False, success=True, account=accounts[0], timings=timings)
     module.exit_json(**result)
 
 
 def main():
-    run_module()
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(**module_spec())
+
+    run_module(module)
 
 
 if __name__ == '__main__':
@@ -5,6 +5,9 @@
 from __future__ import (absolute_import, division, print_function)
 from ansible.module_utils.basic import AnsibleModule
 from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import search_safes
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+import time
 
 __metaclass__ = type
 
@@ -43,12 +46,37 @@ options:
         description:
             - Dictionary set by a CyberArk authentication containing the different values to perform actions on a 
               logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
-        required: true
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
         type: dict
     name:
         description: Name of the safe
         required: true
         type: str
+    multiple:
+        description: Return all safes matching C(name)
+        required: false
+        default: false
+        type: bool
+    fields:
+        description:
+            - List of safe fields to return (eg. C(name), C(cpm), C(description)).
+              C(id) is always returned. Other fields are never copied from PAM's response.
+        required: false
+        type: list
+        elements: str
+    ids_only:
+        description: Only return the ids of the safes found in C(ids).
+        required: false
+        default: false
+        type: bool
+    count_only:
+        description:
+            - Only return the number of safes found in C(count).
+              Fails only if C(state) is C(absent) and safes are found.
+        required: false
+        default: false
+        type: bool
 # Specify this value according to your collection
 # in format of namespace.collection.doc_fragment_name
 # extends_documentation_fragment:
@@ -95,6 +123,21 @@ response:
     description: Response from PAM containing the error
     returned: when not C(success)
     type: text
+count:
+    description: Number of safes found
+    returned: when C(state)==present and C(count_only) and C(success)
+    type: int
+timings:
+    description:
+        - Duration of the search in seconds, with the bytes received from PAM (C(compressed_bytes)) and decoded
+          (C(uncompressed_bytes)). Responses are compressed when PAM supports it (gzip or deflate).
+    returned: when C(state)==present and C(success)
+    type: dict
+    sample: {"search": 4.321, "compressed_bytes": 1250000, "uncompressed_bytes": 8400000}
+ids:
+    description: List of the ids of the safes found
+    returned: when C(state)==present and C(ids_only) and C(success)
+    type: list
 safes:
     description: List of safes found
     returned: when C(state)==present and C(multiple) and C(success)
@@ -184,19 +227,20 @@ safe:
 '''
 
 
-def run_module():
+# AnsibleModule arguments, shared with the action plugin running the module on the controller
+def module_spec():
     module_args = {
         "state": {
-           "type": "str",
-           "choices": ["present", "absent"],
-           "default": "present",
+            "type": "str",
+            "choices": ["present", "absent"],
+            "default": "present",
         },
         "validate_certs": {
             "type": "bool",
             "default": "true"
         },
         "cyberark_session": {
-            "required": True,
+            "required": False,
             "type": "dict",
             "no_log": True
         },
@@ -208,21 +252,38 @@ def run_module():
             "type": "bool",
             "default": "false"
         },
+        "fields": {
+            "required": False,
+            "type": "list",
+            "elements": "str"
+        },
+        "ids_only": {
+            "type": "bool",
+            "default": False
+        },
+        "count_only": {
+            "type": "bool",
+            "default": False
+        },
     }
 
-    # the AnsibleModule object will be our abstraction working with Ansible
-    # this includes instantiation, a couple of common attr would be the
-    # args/params passed to the execution, as well as if the module
-    # supports check mode
-    module = AnsibleModule(
+    return dict(
         argument_spec=module_args,
-        supports_check_mode=True
+        supports_check_mode=True,
+        mutually_exclusive=[["fields", "ids_only", "count_only"]],
     )
 
+
+# module is an AnsibleModule, or the action plugin's ModuleShim on the controller
+def run_module(module):
+    module.params['cyberark_session'] = req_module_session(module)
+
     # Search for safes with matching fields
-    search = search_safes(module)
+    started = time.time()
+    search = search_safes(module.params)
     if not search['success']:
         module.fail_json(success=False, msg="Search failed", response=search['content'])
+    timings = dict(search=round(time.time() - started, 3), **search['transfer'])
 
     safes = search['content']
     # Handle case: Safe mustn't exist (state=absent)
@@ -233,25 +294,40 @@ def run_module():
             result = dict(changed=False, success=True)
             module.exit_json(**result)
 
+    # Handle case: Only count safes
+    if module.params['count_only']:
+        result = dict(changed=False, success=True, count=len(safes), timings=timings)
+        module.exit_json(**result)
+
     # Handle case: One safe must exist (state=present)
     if len(safes) == 0:
         module.fail_json(success=False, msg='No safe found', response=search['content'])
 
-    if module.params['multiple']:
-        result = dict(changed=False, success=True, safes=safes)
+    if not module.params['multiple'] and len(safes) > 1:
+        # We must have exactly one safe
+        module.fail_json(success=False, msg='Found multiple safes', response=search['content'])
+
+    if module.params['ids_only']:
+        result = dict(changed=False, success=True, ids=[safe['id'] for safe in safes], timings=timings)
         module.exit_json(**result)
 
-    # We must have exactly one safe
-    if len(safes) > 1:
-        module.fail_json(success=False, msg='Found multiple safes', response=search['content'])
+    if module.params['multiple']:
+        result = dict(changed=False, success=True, safes=safes, timings=timings)
+        module.exit_json(**result)
 
     # Return safe
-    result = dict(changed=False, success=True, safe=safes[0])
+    result = dict(changed=False, success=True, safe=safes[0], timings=timings)
     module.exit_json(**result)
 
 
 def main():
-    run_module()
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(**module_spec())
+
+    run_module(module)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: get_secrets
+
+short_description: Retrieve the secrets of several accounts.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Find several accounts and retrieve their secrets (password or ssh key) concurrently, in a single task.
+   Connections to PAM are reused between requests.
+   Secrets are only kept in memory on the controller. The task's result is never displayed, as with C(no_log).
+   Never changes.
+   Fails if an account cannot be found, if a secret cannot be retrieved or if there is an error.
+ - This module is implemented as an action plugin and runs on the controller.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    accounts:
+        description: Accounts to retrieve. Either I(id) or I(safe) is required.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            id:
+                description: Internal ObjectID of the account. If used, no search is done.
+                required: false
+                type: str
+            safe:
+                description: The safe in PAM where the privileged account is to be located.
+                required: false
+                type: str
+            identified_by:
+                description: Fields used to identify a single account.
+                required: false
+                default: username,address,platform_id
+                type: str
+            username:
+                description: Account's username.
+                required: false
+                type: str
+            address:
+                description: Account's address.
+                required: false
+                type: str
+            platform_id:
+                description: Id of the platform associated with the account.
+                required: false
+                type: str
+            name:
+                description: Name of the account. If used, identified_by fields are ignored.
+                required: false
+                type: str
+            secret_type:
+                description: Account's secret type.
+                required: false
+                choices: [password, key]
+                type: str
+    reason:
+        description: Reason for retrieving the secrets, recorded in PAM's audit.
+        required: true
+        type: str
+    parallelism:
+        description: Maximum number of concurrent requests to PAM.
+        required: false
+        default: 10
+        type: int
+    min_parallelism:
+        description:
+            - Minimum number of concurrent secret retrievals.
+            - When lower than C(parallelism), the concurrency starts at C(min_parallelism) and adapts to PAM's
+              latency and errors, up to C(parallelism).
+            - By default, the concurrency is fixed to C(parallelism).
+        required: false
+        type: int
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Retrieve the root passwords of the hosts"
+  cyberarkfrlab.pam.get_secrets:
+    accounts:
+      - { safe: "Linux_Passwords", username: "root", address: "10.0.0.1", platform_id: "UnixSSH" }
+      - { safe: "Linux_Passwords", username: "root", address: "10.0.0.2", platform_id: "UnixSSH" }
+      - { id: "12_34" }
+    reason: "Maintenance wave"
+    cyberark_session: "{{ cyberark_session }}"
+  run_once: true
+  delegate_to: localhost
+  register: root_passwords
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Always false.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether all the secrets were retrieved.
+    returned: always
+    type: bool
+errors:
+    description: Accounts which could not be found or retrieved, by index in I(accounts).
+    returned: when not success
+    type: list
+    elements: dict
+concurrency:
+    description:
+        - Concurrency reached (C(concurrency)) between C(min_parallelism) and C(parallelism), with the p95 latency of
+          PAM in seconds, the number of requests, of requests throttled by PAM (429, 503) and of reductions.
+    returned: when the secrets were retrieved
+    type: dict
+    sample: {"concurrency": 24, "min_concurrency": 4, "max_concurrency": 50, "p95_latency": 0.412,
+             "requests": 2500, "throttled": 0, "decreases": 2}
+secrets:
+    description: One item per account, in the same order as I(accounts).
+    returned: when success
+    type: list
+    elements: dict
+    contains:
+        id:
+            description: Internal ObjectID of the account.
+            returned: always
+            type: str
+            sample: "12_34"
+        safe:
+            description: Account's safe.
+            returned: when the account was searched
+            type: str
+        username:
+            description: Account's username.
+            returned: when the account was searched
+            type: str
+        address:
+            description: Account's address.
+            returned: when the account was searched
+            type: str
+        platform_id:
+            description: Id of the platform associated with the account.
+            returned: when the account was searched
+            type: str
+        secret_type:
+            description: Account's secret type.
+            returned: when the account was searched
+            type: str
+        secret:
+            description: Password or private ssh key of the account.
+            returned: always
+            type: str
+'''
@@ -0,0 +1,234 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.index import (index_connect, index_get_safe_snapshot,
+                                                                              index_apply_safe_delta,
+                                                                              index_replace_safes)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import search_safes
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.sync import sync_safe_accounts
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: index_accounts
+
+short_description: Export accounts and safes to a local SQLite index.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Export the accounts of the given safes (and optionally all safes) to a local SQLite database,
+   to be queried with the M(cyberarkfrlab.pam.account_index) lookup.
+   Accounts are indexed on C(safe), C(username), C(address), C(platform_id), C(secret_type) and C(name).
+   The index is refreshed incrementally, only accounts modified since the previous run are fetched.
+   Changes if at least one account was added, changed or removed.
+   Fails if a safe cannot be listed or if there is an error.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    database:
+        description: Path of the SQLite database. Created if it doesn't exist.
+        required: true
+        type: path
+    safes:
+        description: Safes whose accounts are indexed.
+        required: true
+        type: list
+        elements: str
+    index_safes:
+        description: If C(true), all safes visible to the user are also indexed.
+        required: false
+        default: true
+        type: bool
+    server_filter:
+        description:
+            - If C(true), PAM filters accounts on modification time (C(modificationTime gte)).
+              Set to C(false) if your PAM version doesn't support this filter.
+        required: false
+        default: true
+        type: bool
+    detect_removed:
+        description: If C(true), the ids of the safes' accounts are listed to remove deleted accounts from the index.
+        required: false
+        default: true
+        type: bool
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Refresh local account index"
+  cyberarkfrlab.pam.index_accounts:
+    database: "/var/lib/pam/accounts.db"
+    safes:
+      - "Linux_Passwords"
+      - "Linux_Keys"
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+
+- name: "Query the index"
+  ansible.builtin.debug:
+    msg: "{{ query('cyberarkfrlab.pam.account_index', database='/var/lib/pam/accounts.db', username='operator') }}"
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one account was added, changed or removed from the index.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether the module successfully refreshed the index.
+    returned: always
+    type: bool
+response:
+    description: Response from PAM containing the error
+    returned: when not success
+    type: text
+accounts_added:
+    description: Number of accounts added to the index.
+    returned: when success
+    type: int
+accounts_changed:
+    description: Number of accounts updated in the index.
+    returned: when success
+    type: int
+accounts_removed:
+    description: Number of accounts removed from the index.
+    returned: when success
+    type: int
+safes:
+    description: Number of safes indexed.
+    returned: when success and C(index_safes)
+    type: int
+'''
+
+
+def run_module():
+    module_args = {
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "database": {
+            "required": True,
+            "type": "path"
+        },
+        "safes": {
+            "required": True,
+            "type": "list",
+            "elements": "str"
+        },
+        "index_safes": {
+            "type": "bool",
+            "default": True
+        },
+        "server_filter": {
+            "type": "bool",
+            "default": True
+        },
+        "detect_removed": {
+            "type": "bool",
+            "default": True
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=False
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    cyberark_session = module.params['cyberark_session']
+    connection = index_connect(module.params['database'])
+    result = dict(changed=False, success=True, accounts_added=0, accounts_changed=0, accounts_removed=0)
+
+    if module.params['index_safes']:
+        search = search_safes(dict(cyberark_session=cyberark_session))
+        if not search['success']:
+            module.fail_json(success=False, msg="Search failed", response=search['content'])
+
+        with connection:
+            index_replace_safes(connection, search['content'])
+        result['safes'] = len(search['content'])
+
+    for safe in module.params['safes']:
+        known_accounts, high_water_mark = index_get_safe_snapshot(connection, safe)
+
+        sync = sync_safe_accounts(cyberark_session, safe, known_accounts, high_water_mark,
+                                  module.params['server_filter'], module.params['detect_removed'])
+        if not sync['success']:
+            module.fail_json(success=False, msg="Search failed", response=sync['content'])
+
+        delta = sync['content']
+        # One transaction per safe
+        with connection:
+            index_apply_safe_delta(connection, safe, delta['added'] + delta['changed'], delta['removed'],
+                                   delta['high_water_mark'])
+
+        result['accounts_added'] += len(delta['added'])
+        result['accounts_changed'] += len(delta['changed'])
+        result['accounts_removed'] += len(delta['removed'])
+
+    connection.close()
+
+    result['changed'] = (result['accounts_added'] + result['accounts_changed'] + result['accounts_removed']) > 0
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
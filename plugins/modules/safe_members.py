@@ -0,0 +1,308 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.safe import (search_safe_members, safe_members_diff,
+                                                                             apply_safe_member_operation,
+                                                                             API_SAFE_MEMBER_PERMISSION_KEY_MAP)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.bulk import bulk_run
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import ConnectionPool, req_module_session
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: safe_members
+
+short_description: Manage the members of several safes.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Fetch the current members of each safe once, compare them to the desired members and only apply the differences
+   (members added, permissions updated, members removed). Safes and changes are processed concurrently.
+   Changes if at least one member is added, updated or removed.
+   Fails if a safe's members cannot be fetched, if a change cannot be applied or if there is an error.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    safes:
+        description: Safes to manage.
+        required: true
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description: Name of the safe.
+                required: true
+                type: str
+            members:
+                description: Desired members of this safe. Defaults to I(members).
+                required: false
+                type: list
+                elements: dict
+    members:
+        description: Desired members of the safes which don't define their own.
+        required: false
+        default: []
+        type: list
+        elements: dict
+        suboptions:
+            name:
+                description: Name of the user, group or role.
+                required: true
+                type: str
+            member_type:
+                description: Type of the member. Only used when adding the member.
+                required: false
+                choices: [User, Group, Role]
+                type: str
+            search_in:
+                description: Vault or domain where the member is searched. Only used when adding the member.
+                required: false
+                type: str
+            permissions:
+                description:
+                    - Permissions of the member (eg. C(use_accounts), C(retrieve_accounts), C(list_accounts),
+                      C(add_accounts), C(update_account_content), C(update_account_properties),
+                      C(initiate_cpm_account_management_operations), C(specify_next_account_content),
+                      C(rename_accounts), C(delete_accounts), C(unlock_accounts), C(manage_safe),
+                      C(manage_safe_members), C(backup_safe), C(view_audit_log), C(view_safe_members),
+                      C(access_without_confirmation), C(create_folders), C(delete_folders),
+                      C(move_accounts_and_folders), C(requests_authorization_level1), C(requests_authorization_level2)).
+                    - Only the permissions set are compared to the current ones. Unset permissions are disabled when
+                      the member is added.
+                required: false
+                default: {}
+                type: dict
+            state:
+                description: Set to C(absent) to remove the member from the safe.
+                required: false
+                default: present
+                choices: [present, absent]
+                type: str
+    purge:
+        description: Remove the members which are not desired. Predefined users (eg. Master, Batch) are never removed.
+        required: false
+        default: false
+        type: bool
+    parallelism:
+        description: Maximum number of concurrent requests to PAM.
+        required: false
+        default: 10
+        type: int
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Grant the linux teams access to the regional safes"
+  cyberarkfrlab.pam.safe_members:
+    safes:
+      - name: "Linux_EU_Passwords"
+      - name: "Linux_US_Passwords"
+      - name: "Linux_Admin_Passwords"
+        members:
+          - name: "Linux Admins"
+            member_type: "Group"
+            permissions: { use_accounts: true, retrieve_accounts: true, list_accounts: true, manage_safe: true }
+    members:
+      - name: "Linux Operators"
+        member_type: "Group"
+        permissions: { use_accounts: true, list_accounts: true }
+      - name: "Linux Auditors"
+        member_type: "Group"
+        permissions: { list_accounts: true, view_audit_log: true }
+      - name: "john.doe@company.tld"
+        state: absent
+    cyberark_session: "{{ cyberark_session }}"
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one member was added, updated or removed.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether all the changes were applied.
+    returned: always
+    type: bool
+safes:
+    description: One result per safe, in the same order.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        name:
+            description: Name of the safe.
+            type: str
+        added:
+            description: Names of the members added.
+            type: list
+            elements: str
+        updated:
+            description: Names of the members whose permissions were updated.
+            type: list
+            elements: str
+        removed:
+            description: Names of the members removed.
+            type: list
+            elements: str
+        failed:
+            description: Changes which could not be applied, with the response from PAM.
+            type: list
+            elements: dict
+            sample: [{"name": "Linux Operators", "operation": "add", "code": 404, "response": "..."}]
+'''
+
+MEMBER_OPTIONS = {
+    "name": {"required": True, "type": "str"},
+    "member_type": {"type": "str", "choices": ["User", "Group", "Role"]},
+    "search_in": {"type": "str"},
+    "permissions": {"type": "dict", "default": {}},
+    "state": {"type": "str", "choices": ["present", "absent"], "default": "present"},
+}
+
+
+def run_module():
+    module_args = {
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "safes": {
+            "required": True,
+            "type": "list",
+            "elements": "dict",
+            "options": {
+                "name": {"required": True, "type": "str"},
+                "members": {"type": "list", "elements": "dict", "options": MEMBER_OPTIONS},
+            },
+        },
+        "members": {
+            "type": "list",
+            "elements": "dict",
+            "options": MEMBER_OPTIONS,
+            "default": [],
+        },
+        "purge": {
+            "type": "bool",
+            "default": False
+        },
+        "parallelism": {
+            "type": "int",
+            "default": 10
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    cyberark_session = module.params["cyberark_session"]
+    parallelism = module.params["parallelism"]
+
+    safes = [(safe['name'], safe['members'] if safe['members'] is not None else module.params['members'])
+             for safe in module.params['safes']]
+    for safe_name, members in safes:
+        for member in members:
+            unknown = set(member['permissions']) - set(API_SAFE_MEMBER_PERMISSION_KEY_MAP)
+            if len(unknown) > 0:
+                module.fail_json(success=False, msg="Unknown permissions: %s" % ', '.join(sorted(unknown)))
+
+    # Fetch the current members of all the safes concurrently
+    searches = bulk_run(lambda safe: search_safe_members(cyberark_session, safe[0]), safes, parallelism)
+    for (safe_name, members), search in zip(safes, searches):
+        if not search['success']:
+            module.fail_json(success=False, msg="Failed to get the members of safe %s" % safe_name,
+                             response=search['content'])
+
+    # Diff each safe, then apply all the changes concurrently
+    operations = []
+    for (safe_name, members), search in zip(safes, searches):
+        for operation, member in safe_members_diff(search['content'], members, module.params['purge']):
+            operations.append((safe_name, operation, member))
+
+    results = [dict(success=True) for operation in operations]
+    if not module.check_mode:
+        with ConnectionPool(cyberark_session) as pool:
+            results = bulk_run(lambda item: apply_safe_member_operation(cyberark_session, item[0], item[1], item[2],
+                                                                        pool),
+                               operations, parallelism)
+
+    out_safes = dict((safe_name, dict(name=safe_name, added=[], updated=[], removed=[], failed=[]))
+                     for safe_name, members in safes)
+    for (safe_name, operation, member), applied in zip(operations, results):
+        if applied['success']:
+            out_safes[safe_name][{'add': 'added', 'update': 'updated', 'remove': 'removed'}[operation]].append(
+                member['name'])
+        else:
+            out_safes[safe_name]['failed'].append(dict(name=member['name'], operation=operation,
+                                                       code=applied['code'], response=applied['content']))
+
+    out_safes = list(out_safes.values())
+    changed = any(applied['success'] for applied in results)
+    if any(len(out_safe['failed']) > 0 for out_safe in out_safes):
+        module.fail_json(success=False, changed=changed, msg="Failed to apply safe members changes", safes=out_safes)
+
+    result = dict(changed=changed, success=True, safes=out_safes)
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
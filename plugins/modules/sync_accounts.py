@@ -0,0 +1,225 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.sync import (load_sync_state, save_sync_state,
+                                                                             sync_safe_accounts)
+from ansible_collections.cyberarkfrlab.pam.plugins.module_utils.request import req_module_session
+
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: sync_accounts
+
+short_description: Report accounts added, changed and removed since the previous run.
+
+# If this is part of a collection, you need to use semantic versioning,
+# i.e. the version is of the form "2.5.0" and not "2.4".
+version_added: "1.2.0"
+
+description:
+ - Keep a local snapshot of the accounts of each safe with a high-water mark (latest account modification time).
+   The first run lists the whole safes. Later runs only fetch accounts modified since the high-water mark
+   and report added, changed and removed accounts.
+   Changes if at least one account was added, changed or removed.
+   Fails if a safe cannot be listed or if there is an error.
+
+options:
+    validate_certs:
+        description:
+            - If C(false), TLS certificate chain will not be validated.
+              This should only set to C(true) if you have a root CA certificate installed on each node.
+        required: false
+        default: true
+        type: bool
+    cyberark_session:
+        description:
+            - Dictionary set by a CyberArk authentication containing the different values to perform actions on a
+              logged-on CyberArk session, please see M(cyberarkfrlab.pam.login) role for an example of cyberark_session.
+            - Not required when the task uses the C(cyberarkfrlab.pam.pvwa) httpapi connection.
+        required: false
+        type: dict
+    safes:
+        description: Safes to synchronize.
+        required: true
+        type: list
+        elements: str
+    state_file:
+        description:
+            - Path of the local snapshot file (JSON). Created if it doesn't exist.
+              Not written in check mode.
+        required: true
+        type: path
+    server_filter:
+        description:
+            - If C(true), PAM filters accounts on modification time (C(modificationTime gte)).
+              Set to C(false) if your PAM version doesn't support this filter, the whole safes are then listed
+              and filtered locally.
+        required: false
+        default: true
+        type: bool
+    detect_removed:
+        description:
+            - If C(true), the ids of the safes' accounts are listed to detect removed accounts.
+        required: false
+        default: true
+        type: bool
+# Specify this value according to your collection
+# in format of namespace.collection.doc_fragment_name
+# extends_documentation_fragment:
+#     - my_namespace.my_collection.my_doc_fragment_name
+
+author:
+    - Jérôme Coste (@Kanabos)
+'''
+
+EXAMPLES = r'''
+- name: "Login to PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.login
+  vars:
+    login_pam_user: "pam-auto-onboarding@cyberark.cloud.1234"
+    login_pam_pass: "A strong password"
+    login_pam_url: "https://company.privilegecloud.cyberark.cloud"
+    login_identity_url: "https://abc1234.id.cyberark.cloud"
+
+- name: "Report accounts drift since last night"
+  cyberarkfrlab.pam.sync_accounts:
+    safes:
+      - "Linux_Passwords"
+      - "Linux_Keys"
+    state_file: "/var/lib/pam/accounts_snapshot.json"
+    cyberark_session: "{{ cyberark_session }}"
+  register: drift
+
+- name: "Logout from PAM Web portal"
+  ansible.builtin.include_role:
+    name: cyberarkfrlab.pam.logout
+'''
+
+RETURN = r'''
+changed:
+    description: Identify if at least one account was added, changed or removed since the previous run.
+    returned: always
+    type: bool
+failed:
+    description: Whether the module run resulted in a failure of any kind.
+    returned: always
+    type: bool
+success:
+    description: Whether the module successfully synchronized the safes.
+    returned: always
+    type: bool
+response:
+    description: Response from PAM containing the error
+    returned: when not success
+    type: text
+accounts_added:
+    description: Accounts added since the previous run (all accounts on the first run).
+    returned: when success
+    type: list
+accounts_changed:
+    description: Accounts modified since the previous run, as returned by M(cyberarkfrlab.pam.get_account).
+    returned: when success
+    type: list
+accounts_removed:
+    description: Accounts removed since the previous run, as stored in the snapshot.
+    returned: when success
+    type: list
+high_water_marks:
+    description: Latest modification time (Unix time) of the accounts of each safe, properties or secret.
+    returned: when success
+    type: dict
+    sample: {"Linux_Passwords": 1700000000}
+'''
+
+
+def run_module():
+    module_args = {
+        "validate_certs": {
+            "type": "bool",
+            "default": "true"
+        },
+        "cyberark_session": {
+            "required": False,
+            "type": "dict",
+            "no_log": True
+        },
+        "safes": {
+            "required": True,
+            "type": "list",
+            "elements": "str"
+        },
+        "state_file": {
+            "required": True,
+            "type": "path"
+        },
+        "server_filter": {
+            "type": "bool",
+            "default": True
+        },
+        "detect_removed": {
+            "type": "bool",
+            "default": True
+        },
+    }
+
+    # the AnsibleModule object will be our abstraction working with Ansible
+    # this includes instantiation, a couple of common attr would be the
+    # args/params passed to the execution, as well as if the module
+    # supports check mode
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    module.params['cyberark_session'] = req_module_session(module)
+
+    try:
+        state = load_sync_state(module.params['state_file'])
+    except ValueError as decode_exception:
+        module.fail_json(success=False, msg="Invalid state file", response=str(decode_exception))
+
+    result = dict(changed=False, success=True, accounts_added=[], accounts_changed=[], accounts_removed=[],
+                  high_water_marks={})
+    for safe in module.params['safes']:
+        snapshot = state['safes'][safe] if safe in state['safes'] else dict(high_water_mark=None, accounts={})
+
+        sync = sync_safe_accounts(module.params['cyberark_session'], safe, snapshot['accounts'],
+                                  snapshot['high_water_mark'], module.params['server_filter'],
+                                  module.params['detect_removed'])
+        if not sync['success']:
+            module.fail_json(success=False, msg="Search failed", response=sync['content'])
+
+        delta = sync['content']
+        result['accounts_added'].extend(delta['added'])
+        result['accounts_changed'].extend(delta['changed'])
+        result['accounts_removed'].extend(delta['removed'])
+        result['high_water_marks'][safe] = delta['high_water_mark']
+
+        # Apply the delta to the snapshot
+        for account in delta['added'] + delta['changed']:
+            snapshot['accounts'][account['id']] = account
+        for account in delta['removed']:
+            del snapshot['accounts'][account['id']]
+        snapshot['high_water_mark'] = delta['high_water_mark']
+        state['safes'][safe] = snapshot
+
+    result['changed'] = (len(result['accounts_added']) + len(result['accounts_changed'])
+                         + len(result['accounts_removed'])) > 0
+
+    if not module.check_mode:
+        save_sync_state(module.params['state_file'], state)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
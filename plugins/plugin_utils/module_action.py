@@ -0,0 +1,109 @@
+# Copyright: (c) 2023, Jerome Coste <contact@jeromecoste.fr>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.common.parameters import remove_values
+from ansible.module_utils.common.text.converters import container_to_text
+from ansible.module_utils.errors import UnsupportedError
+from ansible.plugins.action import ActionBase
+from ansible.utils.display import Display
+
+display = Display()
+
+# Connections of the tasks run in the controller's process. The module is sent to the other hosts as usual.
+CONTROLLER_TRANSPORTS = ('local', 'ansible.builtin.local', 'ansible.netcommon.httpapi')
+
+
+# Raised by ModuleShim.exit_json and fail_json, ending the module as sys.exit does for AnsibleModule
+class ModuleExit(Exception):
+    def __init__(self, result):
+        super(ModuleExit, self).__init__()
+        self.result = result
+
+
+# The part of AnsibleModule used by the collection's modules
+class ModuleShim:
+
+    def __init__(self, params, check_mode, socket_path):
+        self.params = params
+        self.check_mode = check_mode
+        self._socket_path = socket_path
+        self.warnings = []
+
+    def exit_json(self, **kwargs):
+        raise ModuleExit(kwargs)
+
+    def fail_json(self, msg, **kwargs):
+        kwargs.update(failed=True, msg=msg)
+        raise ModuleExit(kwargs)
+
+    def warn(self, warning):
+        self.warnings.append(warning)
+
+    def log(self, msg):
+        display.vvv(msg)
+
+
+# Run an API-only module in the controller's process, without packaging it with AnsiballZ.
+# Subclasses set module to the module (eg. plugins/modules/get_safe.py), which provides module_spec() and
+# run_module(module).
+# Async tasks run the module as usual, in the background with Ansible's async_wrapper.
+# So do tasks with an environment (eg. https_proxy): the module reads it from os.environ, the controller's one here.
+class ModuleActionBase(ActionBase):
+
+    TRANSFERS_FILES = False
+    _supports_async = True
+
+    module = None
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ModuleActionBase, self).run(tmp, task_vars)
+        del tmp
+
+        if self._task.async_val:
+            wrap_async = not self._connection.has_native_async
+            result.update(self._execute_module(task_vars=task_vars, wrap_async=wrap_async))
+            if not wrap_async:
+                self._remove_tmp_path(self._connection._shell.tmpdir)
+            return result
+
+        if self._connection.transport not in CONTROLLER_TRANSPORTS or self._task_environment():
+            result.update(self._execute_module(task_vars=task_vars))
+            return result
+
+        spec = self.module.module_spec()
+        supports_check_mode = spec.pop('supports_check_mode', False)
+        validation = ArgumentSpecValidator(**spec).validate(self._task.args)
+        if validation.error_messages:
+            msg = validation.errors.msg
+            if isinstance(validation.errors[0], UnsupportedError):
+                msg = "Unsupported parameters for (%s) module: %s" % (self._task.action, msg)
+            result.update(failed=True, msg=msg)
+            return result
+
+        if self._task.check_mode and not supports_check_mode:
+            result.update(skipped=True, msg="action (%s) does not support check mode" % self._task.action)
+            return result
+
+        module = ModuleShim(validation.validated_parameters, self._task.check_mode, self._connection.socket_path)
+        try:
+            self.module.run_module(module)
+            module_result = dict(failed=True, msg="The module returned no result")
+        except ModuleExit as module_exit:
+            module_result = module_exit.result
+
+        # Hide no_log values and decode bytes (eg. PAM responses) as AnsibleModule does
+        result.update(container_to_text(remove_values(module_result, validation._no_log_values),
+                                        errors='surrogate_then_replace'))
+        if module.warnings:
+            result['warnings'] = module.warnings
+        return result
+
+    # Templated environment of the task, empty without environment keyword
+    def _task_environment(self):
+        environment = {}
+        self._compute_environment_string(environment)
+        return environment
@@ -0,0 +1,41 @@
+#!/usr/bin/env bash
+
+# Measure the start-up time of the collection's modules: the time to start python and import the module with its
+# module_utils, paid on each task run with AnsiballZ. The first line is the time of ansible.module_utils.basic
+# alone, the part of the start-up the collection cannot trim.
+#
+# Run it from the collection installed in <path>/ansible_collections/cyberarkfrlab/pam, or set COLLECTIONS_PATH
+# to <path>. RUNS sets the number of runs per module, the fastest one is reported.
+
+COLLECTIONS_PATH="${COLLECTIONS_PATH:-$(cd "$(dirname "$0")/../../.." && pwd)}"
+RUNS="${RUNS:-10}"
+
+cd "$(dirname "$0")" || exit 1
+
+# Modules run by action plugins only (documentation stubs) are skipped
+PYTHONPATH="$COLLECTIONS_PATH" python3 - "$RUNS" $(grep -l "AnsibleModule(" plugins/modules/*.py) <<'EOF'
+import os
+import subprocess
+import sys
+import time
+
+
+def startup_time(module, runs):
+    best = None
+    for run in range(runs):
+        start = time.time()
+        subprocess.check_call([sys.executable, '-c', 'import ' + module])
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+runs = int(sys.argv[1])
+baseline = startup_time('ansible.module_utils.basic', runs)
+print('%-40s %6.0f ms' % ('ansible.module_utils.basic', baseline * 1000))
+
+for path in sys.argv[2:]:
+    name = os.path.splitext(os.path.basename(path))[0]
+    elapsed = startup_time('ansible_collections.cyberarkfrlab.pam.plugins.modules.' + name, runs)
+    print('%-40s %6.0f ms (+%.0f ms)' % ('cyberarkfrlab.pam.' + name, elapsed * 1000, (elapsed - baseline) * 1000))
+EOF
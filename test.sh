@@ -24,7 +24,7 @@ check_test () {
 }
 
 # Run all role tests
-mol_tests=("login" "logout" "create_safe" "delete_safe" "get_safe" "get_account" "delete_account" "create_password" "delete_password" "create_key" "delete_key")
+mol_tests=("login" "logout" "create_safe" "delete_safe" "get_safe" "safe_members" "get_account" "get_secrets" "cpm_accounts" "delete_account" "account" "create_accounts" "sync_accounts" "index_accounts" "create_password" "delete_password" "create_key" "delete_key")
 for mol_test in "${mol_tests[@]}"; do
   log "$C_TEST" "test" "$mol_test"
   molecule -v test -s "$mol_test"